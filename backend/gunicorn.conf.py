@@ -0,0 +1,27 @@
+# Production entry point for the Flask app:
+#   gunicorn -c gunicorn.conf.py legal_backend.main:app
+#
+# The app is imported once in the master (preload_app) and forked; every client and
+# model is created per worker by a background bootstrap started in post_worker_init,
+# followed by a warmup query. The worker serves meanwhile, and /api/ready returns 503
+# until that worker's warmup is done.
+# For /metrics across workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+preload_app = True
+
+
+def post_worker_init(worker):
+    from legal_backend.bootstrap import start_bootstrap
+
+    start_bootstrap()
+
+
+def child_exit(server, worker):
+    from legal_backend.utils.tracing import mark_process_dead
+
+    mark_process_dead(worker.pid)
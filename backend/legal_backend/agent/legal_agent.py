@@ -85,7 +85,7 @@ def process_query(query: str) -> dict:
 #     citations = extract_citations(context)
 
 #     # --- Step 5. Generate Answer with Gemini ---
-#     chain = prompt | llm
+#     chain = prompt | get_llm()
 #     response = chain.invoke({
 #         "query": text,
 #         "entities": entities,
@@ -111,20 +111,47 @@ def process_query(query: str) -> dict:
 
 #     import json
 #     print(json.dumps(result, indent=2))
-import re
+import os
 import json
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
 from langchain_google_vertexai import ChatVertexAI
 
-from legal_backend.utils.input_router import input_router
-from legal_backend.utils.response_tool import format_response
+from legal_backend.utils.input_router import route_input
+from legal_backend.utils.citation_tools import resolve_citations
+from legal_backend.utils.response_tool import format_response, parse_llm_json
+from legal_backend.services.answer_cache import build_answer_cache
+from legal_backend.utils.singleflight import SingleFlight, AsyncSingleFlight
+from legal_backend.agent.prompt_builder import build_prompt_inputs, count_tokens
+from legal_backend.agent.long_document import summarize_long_document
+from legal_backend.utils.tracing import span, bind, register_stats
+from legal_backend.config import ASYNC_EXTRACTION_WORKERS, PROMPT_TOKEN_BUDGET, LONG_DOC_MODE
 
-# --- Step 1: Initialize Gemini 2.5 Flash ---
-llm = ChatVertexAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_output_tokens=512,
-)
+LLM_MODEL = "gemini-2.5-flash"
+
+# --- Step 1: Gemini 2.5 Flash, created lazily per process (fork-safe; see bootstrap.py) ---
+_llm = None
+_llm_pid = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> ChatVertexAI:
+    """Returns this process's Gemini chat model, creating it on first use (and after a fork)."""
+    global _llm, _llm_pid
+    if _llm is None or _llm_pid != os.getpid():
+        with _llm_lock:
+            if _llm is None or _llm_pid != os.getpid():
+                _llm = ChatVertexAI(
+                    model=LLM_MODEL,
+                    temperature=0,
+                    max_output_tokens=512,
+                )
+                _llm_pid = os.getpid()
+    return _llm
 
 # --- Step 2: Define prompt for structured response ---
 prompt = ChatPromptTemplate.from_messages([
@@ -145,58 +172,303 @@ prompt = ChatPromptTemplate.from_messages([
         "human",
         "User Query: {query}\n\n"
         "Detected References: {entities}\n\n"
-        "Extracted Text: {raw_text}"
+        "Statute Text: {context}"
     ),
 ])
 
+# --- Answer cache: namespaced by model + prompt, so changing either starts a fresh cache ---
+answer_cache = build_answer_cache(namespace=hashlib.sha256(
+    "\n".join([LLM_MODEL] + [m.prompt.template for m in prompt.messages]).encode("utf-8")
+).hexdigest()[:16])
+
+
+def answer_cache_stats() -> dict:
+    """Hit rate, LLM seconds saved and size of the answer cache ({} when disabled)."""
+    return answer_cache.stats() if answer_cache is not None else {}
+
 
 # --- Step 3: Full pipeline ---
-def process_query(user_input: str) -> dict:
-    """
-    Full legal query pipeline (simplified):
-    1. Route input (OCR, PDF, DOCX, text) → Extract text + NER.
-    2. Pass extracted text + entities to LLM.
-    3. Return structured JSON response.
+def _prepare(user_input: str):
     """
+    Steps 1–2 (CPU/IO-bound, synchronous): route the input and resolve citations.
 
+    Returns:
+        ((raw_text, entities, context), None) on success, (None, error_dict) otherwise.
+    """
     # --- Step 1. Input Routing ---
-    routed = input_router(user_input)
+    routed = route_input(user_input)
 
     if "error" in routed:
-        return {"error": routed["error"], "source": routed.get("source", user_input)}
+        return None, {"error": routed["error"], "source": routed.get("source", user_input)}
 
     raw_text = routed.get("raw_text", "")
-    entities = routed.get("ner", {}).get("entities", [])
-
-
-    # --- Step 2. Generate Answer with Gemini ---
-    chain = prompt | llm
-    response = chain.invoke({
-        "query": raw_text,
-        "entities": [e["reference"] for e in entities] if entities else [],
-        "raw_text": raw_text  # ✅ required by prompt
-    })
-    content = getattr(response, "content", "").strip()
-    cleaned = re.sub(r"^```json|```$", "", content, flags=re.MULTILINE).strip()
-    try:
-        llm_json = json.loads(cleaned)
-    except Exception:
-        llm_json = {
-            "summary": content,
-            "explanation": "",
-            "citations": []
-        }
-
-    # --- Step 3. Format JSON Output ---
+    entities = routed.get("legal_entities", [])
+
+    # --- Step 2. Resolve explicit citations (dictionary lookup, no retrieval call) ---
+    with span("resolve_citations"):
+        statutes = resolve_citations(entities)
+    context = "\n\n".join(f"{s['citation']} — {s['title']}\n{s['text']}".strip() for s in statutes)
+    return (raw_text, entities, context), None
+
+
+def _chain_inputs(raw_text: str, entities: list, context: str):
+    """Prompt variables (text included once, within PROMPT_TOKEN_BUDGET) and their token usage."""
+    return build_prompt_inputs(prompt, raw_text, entities, context, model_name=LLM_MODEL)
+
+
+def _is_long(prepared) -> bool:
+    """Whether the text is answered by the map-reduce long-document mode."""
+    return LONG_DOC_MODE == "auto" and count_tokens(prepared[0], LLM_MODEL) > PROMPT_TOKEN_BUDGET
+
+
+def _long_answer(prepared):
+    """Map-reduce answer for text over the prompt budget; returns (result, llm_seconds)."""
+    start = time.perf_counter()
+    with span("long_document"):
+        answer, usage = summarize_long_document(*prepared, llm=get_llm(), model_name=LLM_MODEL)
+    return _finish(*prepared, answer, usage), time.perf_counter() - start
+
+
+def _reported_tokens(usage: dict, usage_metadata) -> dict:
+    """Adds Gemini's own input-token count, when the response carries one."""
+    if usage_metadata and usage_metadata.get("input_tokens"):
+        usage["input_tokens_reported"] = usage_metadata["input_tokens"]
+    return usage
+
+
+def _cached_answer(prepared):
+    """Cached response for an equivalent earlier query, or None."""
+    if answer_cache is None:
+        return None
+    raw_text, entities, _ = prepared
+    with span("answer_cache"):
+        cached = answer_cache.get(raw_text, entities)
+    if cached is not None:
+        cached["metadata"] = {**cached.get("metadata", {}), "tokens_sent": 0}
+    return cached
+
+
+def _store_answer(prepared, result: dict, llm_seconds: float, use_cache: bool = True) -> dict:
+    """Marks a fresh response and caches it (unless use_cache is False, e.g. the warmup query)."""
+    if answer_cache is not None and use_cache:
+        raw_text, entities, _ = prepared
+        answer_cache.set(raw_text, entities, result, llm_seconds)
+    result["cached"] = False
+    return result
+
+
+def _finish(raw_text: str, entities: list, context: str, content, usage: dict = None) -> dict:
+    """Parses the model's JSON answer (or takes an already parsed dict) and formats the API response."""
+    llm_json = content if isinstance(content, dict) else parse_llm_json(content)
+
+    # --- Step 4. Format JSON Output ---
     return format_response(
         query=raw_text,
         entities=entities,
-        context="",  # No retrieval, so empty
+        context=context,
         llm_answer= llm_json,
-        citations=llm_json.get("citations", [])
+        citations=llm_json.get("citations", []),
+        metadata=usage
     )
 
 
+# --- Coalescing: concurrent identical queries share one in-flight NER + Gemini run ---
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+
+
+def _flight_key(user_input: str, use_cache: bool) -> str:
+    """
+    Query text in case- and whitespace-insensitive form; a file path (as route_input
+    detects it) by file identity instead (real path, size, mtime), so paths differing
+    in case stay distinct and a rewritten file is not joined to an older run.
+    """
+    identity = "text\n" + " ".join((user_input or "").split()).casefold()
+    if user_input and os.path.isfile(user_input):
+        try:
+            stat = os.stat(user_input)
+            identity = f"file\n{os.path.realpath(user_input)}\n{stat.st_size}\n{stat.st_mtime_ns}"
+        except OSError:
+            pass  # removed meanwhile; route_input will report it
+    return hashlib.sha256(f"{use_cache}\n{identity}".encode("utf-8")).hexdigest()
+
+
+def coalescing_stats() -> dict:
+    """Executed vs coalesced query counts for the threaded and async paths (this process)."""
+    return {"threaded": dict(_flight.stats), "async": dict(_async_flight.stats)}
+
+
+register_stats("answer_cache", answer_cache_stats)
+register_stats("coalescing", coalescing_stats)
+
+
+def process_query(user_input: str, use_cache: bool = True) -> dict:
+    """
+    Runs _process_query, coalescing concurrent calls with the same input into one.
+    """
+    return _flight.do(_flight_key(user_input, use_cache), _process_query, user_input, use_cache)
+
+
+def _process_query(user_input: str, use_cache: bool = True) -> dict:
+    """
+    Full legal query pipeline (simplified):
+    1. Route input (OCR, PDF, DOCX, text) → Extract text + NER.
+    2. Resolve explicit citations to statute text via the citation index,
+       and return a cached answer for an equivalent query if there is one.
+    3. Pass extracted text (once, trimmed to PROMPT_TOKEN_BUDGET) + entities + statute text to LLM;
+       text over the budget goes through the map-reduce long-document mode instead.
+    4. Return structured JSON response ("cached" says whether the LLM was skipped).
+    """
+    prepared, error = _prepare(user_input)
+    if error:
+        return error
+
+    cached = _cached_answer(prepared) if use_cache else None
+    if cached is not None:
+        return cached
+
+    # --- Step 3. Generate Answer with Gemini (map-reduce for text over the budget) ---
+    if _is_long(prepared):
+        return _store_answer(prepared, *_long_answer(prepared), use_cache=use_cache)
+    start = time.perf_counter()
+    chain = prompt | get_llm()
+    inputs, usage = _chain_inputs(*prepared)
+    with span("gemini"):
+        response = chain.invoke(inputs)
+    usage = _reported_tokens(usage, getattr(response, "usage_metadata", None))
+    result = _finish(*prepared, getattr(response, "content", ""), usage)
+    return _store_answer(prepared, result, time.perf_counter() - start, use_cache=use_cache)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_extraction_executor() -> ThreadPoolExecutor:
+    """Bounded pool that keeps extraction/NER off the event loop in async serving mode."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=ASYNC_EXTRACTION_WORKERS,
+                                               thread_name_prefix="extract")
+    return _executor
+
+
+async def process_query_async(user_input: str) -> dict:
+    """
+    Async process_query for the ASGI server: extraction and citation lookup run in
+    the extraction executor, and the Gemini call is awaited, so one event loop can
+    hold many queries in flight. Concurrent identical queries share one run.
+    """
+    return await _async_flight.do(_flight_key(user_input, True), _process_query_async, user_input)
+
+
+async def _process_query_async(user_input: str) -> dict:
+    loop = asyncio.get_running_loop()
+    executor = get_extraction_executor()
+    prepared, error = await loop.run_in_executor(executor, bind(_prepare), user_input)
+    if error:
+        return error
+
+    cached = await loop.run_in_executor(executor, bind(_cached_answer), prepared)
+    if cached is not None:
+        return cached
+
+    if _is_long(prepared):
+        # Map calls run on LangChain's batch threads, bounded by LONG_DOC_PARALLELISM
+        result, llm_seconds = await loop.run_in_executor(executor, bind(_long_answer), prepared)
+        return await loop.run_in_executor(executor, bind(_store_answer), prepared, result, llm_seconds)
+
+    start = time.perf_counter()
+    chain = prompt | get_llm()
+    inputs, usage = await loop.run_in_executor(executor, bind(_chain_inputs), *prepared)
+    with span("gemini"):
+        response = await chain.ainvoke(inputs)
+    usage = _reported_tokens(usage, getattr(response, "usage_metadata", None))
+    result = _finish(*prepared, getattr(response, "content", ""), usage)
+    return await loop.run_in_executor(executor, bind(_store_answer), prepared, result, time.perf_counter() - start)
+
+
+def stream_query(user_input: str):
+    """
+    Streaming process_query for the SSE endpoint. Yields (event, data) pairs:
+    "entities" as soon as NER and citation lookup are done, then one "token" per
+    Gemini chunk (raw model output), then "result" with the same shape as
+    process_query's response. Cache hits and long documents (map-reduce) skip the
+    tokens. Failures yield a single "error" event.
+    """
+    prepared, error = _prepare(user_input)
+    if error:
+        yield "error", error
+        return
+
+    raw_text, entities, context = prepared
+    yield "entities", {"legal_entities": entities, "context": context}
+
+    cached = _cached_answer(prepared)
+    if cached is not None:
+        yield "result", cached
+        return
+
+    if _is_long(prepared):
+        yield "result", _store_answer(prepared, *_long_answer(prepared))
+        return
+
+    parts, reported = [], None
+    start = time.perf_counter()
+    chain = prompt | get_llm()
+    inputs, usage = _chain_inputs(*prepared)
+    with span("gemini"):
+        for chunk in chain.stream(inputs):
+            reported = getattr(chunk, "usage_metadata", None) or reported
+            text = getattr(chunk, "content", "")
+            if text:
+                parts.append(text)
+                yield "token", {"text": text}
+
+    result = _finish(*prepared, "".join(parts), _reported_tokens(usage, reported))
+    yield "result", _store_answer(prepared, result, time.perf_counter() - start)
+
+
+async def astream_query(user_input: str):
+    """Async stream_query for the ASGI server (extraction in the executor, tokens awaited)."""
+    loop = asyncio.get_running_loop()
+    executor = get_extraction_executor()
+    prepared, error = await loop.run_in_executor(executor, bind(_prepare), user_input)
+    if error:
+        yield "error", error
+        return
+
+    raw_text, entities, context = prepared
+    yield "entities", {"legal_entities": entities, "context": context}
+
+    cached = await loop.run_in_executor(executor, bind(_cached_answer), prepared)
+    if cached is not None:
+        yield "result", cached
+        return
+
+    if _is_long(prepared):
+        result, llm_seconds = await loop.run_in_executor(executor, bind(_long_answer), prepared)
+        yield "result", await loop.run_in_executor(executor, bind(_store_answer), prepared, result, llm_seconds)
+        return
+
+    parts, reported = [], None
+    start = time.perf_counter()
+    chain = prompt | get_llm()
+    inputs, usage = await loop.run_in_executor(executor, bind(_chain_inputs), *prepared)
+    with span("gemini"):
+        async for chunk in chain.astream(inputs):
+            reported = getattr(chunk, "usage_metadata", None) or reported
+            text = getattr(chunk, "content", "")
+            if text:
+                parts.append(text)
+                yield "token", {"text": text}
+
+    result = _finish(*prepared, "".join(parts), _reported_tokens(usage, reported))
+    yield "result", await loop.run_in_executor(executor, bind(_store_answer), prepared, result, time.perf_counter() - start)
+
+
 if __name__ == "__main__":
     # Quick test
     sample_query = "What does Article 21 of the Indian Constitution say?"
@@ -0,0 +1,304 @@
+import re
+import json
+import logging
+from langchain.prompts import ChatPromptTemplate
+
+from legal_backend.agent.prompt_builder import count_tokens, split_passages, select_passages, render_prompt
+from legal_backend.utils.response_tool import parse_llm_json
+from legal_backend.utils.tracing import span
+from legal_backend.config import (
+    PROMPT_TOKEN_BUDGET, LONG_DOC_CHUNK_TOKENS, LONG_DOC_PARALLELISM, LONG_DOC_REDUCE_FANIN,
+    LONG_DOC_MAX_REDUCE_LEVELS,
+)
+
+logger = logging.getLogger(__name__)
+
+# First line of a new part of a judgment or statute; chunks prefer to start on one
+SECTION_HEADING = re.compile(
+    r"^\s*(?:(?:PART|CHAPTER|SECTION|ARTICLE|SCHEDULE)\b.*"
+    r"|[IVXLC]+\.\s.*"
+    r"|\d{1,3}\.\s+[A-Z].*"
+    r"|(?:JUDGMENT|ORDER|FACTS|ISSUES?|ARGUMENTS|ANALYSIS|FINDINGS|CONCLUSION|HELD)\b[^a-z]*)$"
+)
+
+map_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are legal assistant summarizing one part of a long legal document. "
+        "Always respond in **valid JSON** format with fields:\n"
+        "{{\n"
+        '  "summary": "...",\n'
+        '  "key_points": ["..."],\n'
+        '  "citations": ["..."]\n'
+        "}}\n\n"
+        "Rules:\n"
+        "- Summarize only this part; do not guess about the rest of the document.\n"
+        "- key_points: facts, arguments, findings or holdings stated in this part.\n"
+        "- citations: only provisions and cases that appear in this part, else keep it empty.\n"
+    ),
+    (
+        "human",
+        "Part {index} of {total}\n\n"
+        "Detected References: {entities}\n\n"
+        "Text: {text}"
+    ),
+])
+
+reduce_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are legal assistant merging summaries of consecutive parts of one legal document. "
+        "Always respond in **valid JSON** format with fields:\n"
+        "{{\n"
+        '  "summary": "...",\n'
+        '  "key_points": ["..."],\n'
+        '  "citations": ["..."]\n'
+        "}}\n\n"
+        "Rules:\n"
+        "- Keep the document's order and every distinct finding; drop repetition.\n"
+        "- citations: the union of the parts' citations.\n"
+    ),
+    (
+        "human",
+        "Part summaries (in document order):\n{partials}"
+    ),
+])
+
+final_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are legal assistant. You are given summaries of every part of a long legal document, "
+        "in order. Always respond in **valid JSON** format with fields:\n"
+        "{{\n"
+        '  "summary": "...",\n'
+        '  "explanation": "...",\n'
+        '  "citations": ["..."]\n'
+        "}}\n\n"
+        "Rules:\n"
+        "- Use only educational terminology.\n"
+        "- Be concise and accurate.\n"
+        "- Always include citations if available, else keep it empty.\n"
+    ),
+    (
+        "human",
+        "Detected References: {entities}\n\n"
+        "Statute Text: {context}\n\n"
+        "Part summaries (in document order):\n{partials}"
+    ),
+])
+
+
+def chunk_document(text: str, entities: list, max_tokens: int = LONG_DOC_CHUNK_TOKENS,
+                   model_name: str = "gemini-2.5-flash") -> list:
+    """
+    Groups consecutive passages (see split_passages) into chunks of at most max_tokens.
+    Once a chunk is half full, a section heading starts the next one.
+
+    Returns:
+        list[dict]: {"index", "start", "end", "text", "entities"} per chunk, where
+        "entities" are the canonical references occurring inside the chunk.
+    """
+    spans, start, end, tokens = [], None, None, 0
+    for s, e in split_passages(text):
+        passage_tokens = count_tokens(text[s:e], model_name)
+        heading = SECTION_HEADING.match(text[s:e].strip().split("\n", 1)[0])
+        if start is not None and (tokens + passage_tokens > max_tokens or (heading and tokens >= max_tokens // 2)):
+            spans.append((start, end))
+            start, tokens = None, 0
+        if start is None:
+            start = s
+        end, tokens = e, tokens + passage_tokens
+    if start is not None:
+        spans.append((start, end))
+
+    chunks = []
+    for index, (start, end) in enumerate(spans, 1):
+        names = []
+        for entity in entities or []:
+            occurrences = entity.get("occurrences") or [[entity.get("start", -1), entity.get("end", -1)]]
+            name = entity.get("canonical", entity.get("reference"))
+            if name not in names and any(start <= s < end for s, _ in occurrences):
+                names.append(name)
+        chunks.append({"index": index, "start": start, "end": end, "text": text[start:end], "entities": names})
+    return chunks
+
+
+def _render_partial(partial: dict) -> str:
+    return json.dumps({
+        "parts": partial["parts"],
+        "summary": partial.get("summary", ""),
+        "key_points": partial.get("key_points", []),
+        "citations": partial.get("citations", []),
+    }, ensure_ascii=False)
+
+
+def _partial(parsed: dict, first: int, last: int) -> dict:
+    key_points = parsed.get("key_points") or []
+    citations = parsed.get("citations") or []
+    return {
+        "parts": str(first) if first == last else f"{first}-{last}",
+        "first": first,
+        "last": last,
+        "summary": str(parsed.get("summary", "")),
+        "key_points": [str(p) for p in key_points] if isinstance(key_points, list) else [str(key_points)],
+        "citations": [str(c) for c in citations] if isinstance(citations, list) else [str(citations)],
+    }
+
+
+def _fit_partial(partial: dict, budget: int, model_name: str) -> dict:
+    """The partial cut down to `budget` tokens: key points dropped from the end, then the summary shortened."""
+    partial = dict(partial, key_points=list(partial["key_points"]))
+    while partial["key_points"] and count_tokens(_render_partial(partial), model_name) > budget:
+        partial["key_points"].pop()
+    summary = partial["summary"]
+    while summary and count_tokens(_render_partial(partial), model_name) > budget:
+        summary = summary[:int(len(summary) * 0.8)].rstrip()
+        partial["summary"] = summary + "…"
+    return partial
+
+
+def _group(partials: list, fanin: int, budget: int, model_name: str) -> list:
+    """Consecutive partials, at most `fanin` and `budget` tokens per group."""
+    groups, current, tokens = [], [], 0
+    for partial in partials:
+        partial_tokens = count_tokens(_render_partial(partial), model_name)
+        if current and (len(current) >= fanin or tokens + partial_tokens > budget):
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(partial)
+        tokens += partial_tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+class _Runner:
+    """Runs one prompt over many inputs with bounded concurrency and tallies usage."""
+
+    def __init__(self, llm, parallelism: int, model_name: str):
+        self.llm = llm
+        self.parallelism = max(1, parallelism)
+        self.model_name = model_name
+        self.calls = 0
+        self.tokens_sent = 0
+
+    def run(self, prompt, inputs: list) -> list:
+        """Parsed JSON per input, or the exception raised for it."""
+        self.calls += len(inputs)
+        self.tokens_sent += sum(count_tokens(render_prompt(prompt, i), self.model_name) for i in inputs)
+        with span("gemini") as gemini_span:
+            outputs = (prompt | self.llm).batch(
+                inputs, config={"max_concurrency": self.parallelism}, return_exceptions=True
+            )
+            failed = [o for o in outputs if isinstance(o, Exception)]
+            if failed:
+                gemini_span.fail(type(failed[0]).__name__)
+        return [o if isinstance(o, Exception) else parse_llm_json(getattr(o, "content", o)) for o in outputs]
+
+
+def summarize_long_document(raw_text: str, entities: list, context: str, llm=None,
+                            parallelism: int = LONG_DOC_PARALLELISM,
+                            chunk_tokens: int = LONG_DOC_CHUNK_TOKENS,
+                            fanin: int = LONG_DOC_REDUCE_FANIN,
+                            budget: int = PROMPT_TOKEN_BUDGET,
+                            model_name: str = "gemini-2.5-flash"):
+    """
+    Map-reduce answer for text too long for one prompt:
+    1. Map: chunk_document(), then one map_prompt call per chunk (the chunk's own
+       references listed), at most `parallelism` calls at a time.
+    2. Reduce: partial results are merged in consecutive groups of at most `fanin`
+       (and `budget` tokens) with reduce_prompt, level by level, until one final_prompt
+       call fits them all. A partial alone in its group passes through without a call.
+       If a level cannot merge anything (every partial fills a group by itself) or
+       LONG_DOC_MAX_REDUCE_LEVELS is reached, the remaining partials are shortened to
+       share the final prompt's budget instead.
+    Latency is about ceil(chunks / parallelism) map calls plus one call per reduce level.
+
+    Args:
+        llm: Any LangChain chat model (defaults to the agent's Gemini model); tests pass a fake.
+
+    Returns:
+        (answer, usage): answer has the {summary, explanation, citations} shape of the
+        single-prompt path; usage has mode, chunks, failed_chunks, reduce_levels,
+        llm_calls and tokens_sent (all calls).
+    """
+    if llm is None:
+        from legal_backend.agent.legal_agent import get_llm
+        llm = get_llm()
+    runner = _Runner(llm, parallelism, model_name)
+
+    # --- Map ---
+    chunks = chunk_document(raw_text, entities, chunk_tokens, model_name)
+    outputs = runner.run(map_prompt, [
+        {"index": c["index"], "total": len(chunks), "entities": c["entities"], "text": c["text"]} for c in chunks
+    ])
+    partials, failed = [], []
+    for chunk, output in zip(chunks, outputs):
+        if isinstance(output, Exception):
+            logger.warning("⚠️ Long-document map failed for part %d: %s", chunk["index"], output)
+            failed.append(output)
+        else:
+            partials.append(_partial(output, chunk["index"], chunk["index"]))
+    if not partials:
+        raise failed[0]
+    logger.info("🧩 Long document: %d chunks summarized (%d failed)", len(chunks), len(failed))
+
+    # --- Reduce (hierarchical) ---
+    names = [e.get("canonical", e["reference"]) for e in entities] if entities else []
+    context, _ = select_passages(context or "[No statute text resolved]", [], budget // 4, model_name)
+    final_fixed = count_tokens(render_prompt(final_prompt, {"entities": names, "context": context, "partials": ""}),
+                               model_name)
+    partial_budget = max(budget - final_fixed, budget // 4)
+
+    levels = 0
+    groups = _group(partials, fanin, partial_budget, model_name)
+    while len(groups) > 1:
+        to_reduce = [group for group in groups if len(group) > 1]
+        if not to_reduce or levels >= LONG_DOC_MAX_REDUCE_LEVELS:
+            logger.warning("⚠️ Long-document reduce stopped at level %d with %d partials; shortening them",
+                           levels, len(partials))
+            partials = [_fit_partial(p, partial_budget // len(partials), model_name) for p in partials]
+            break
+
+        outputs = iter(runner.run(reduce_prompt, [
+            {"partials": "\n".join(_render_partial(p) for p in group)} for group in to_reduce
+        ]))
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            output = next(outputs)
+            first, last = group[0]["first"], group[-1]["last"]
+            if isinstance(output, Exception):
+                logger.warning("⚠️ Long-document reduce failed for parts %s-%s: %s", first, last, output)
+                # Keep the group's content, cut to what one partial may use
+                joined = _partial({
+                    "summary": " ".join(p["summary"] for p in group),
+                    "key_points": [k for p in group for k in p["key_points"]],
+                    "citations": list(dict.fromkeys(c for p in group for c in p["citations"])),
+                }, first, last)
+                merged.append(_fit_partial(joined, partial_budget, model_name))
+            else:
+                merged.append(_partial(output, first, last))
+        partials = merged
+        levels += 1
+        groups = _group(partials, fanin, partial_budget, model_name)
+
+    final = runner.run(final_prompt, [
+        {"entities": names, "context": context, "partials": "\n".join(_render_partial(p) for p in partials)}
+    ])[0]
+    if isinstance(final, Exception):
+        raise final
+
+    if not final.get("citations"):
+        final["citations"] = list(dict.fromkeys(c for p in partials for c in p["citations"]))
+    return final, {
+        "mode": "map_reduce",
+        "chunks": len(chunks),
+        "failed_chunks": len(failed),
+        "reduce_levels": levels + 1,
+        "llm_calls": runner.calls,
+        "tokens_sent": runner.tokens_sent,
+        "parallelism": runner.parallelism,
+    }
@@ -0,0 +1,174 @@
+import re
+import bisect
+import logging
+import threading
+
+from legal_backend.config import PROMPT_TOKEN_BUDGET, PROMPT_TOKENIZER, PROMPT_PASSAGE_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Rough Gemini ratio for English legal text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+PASSAGE_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"[.;:?!]\s")
+OMISSION = "\n[…]\n"
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _get_tokenizer(model_name: str):
+    """Local Gemini tokenizer (vertexai[tokenization]) when PROMPT_TOKENIZER=vertex, else None."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                if PROMPT_TOKENIZER == "vertex":
+                    try:
+                        from vertexai.preview.tokenization import get_tokenizer_for_model
+                        _tokenizer = get_tokenizer_for_model(model_name)
+                    except Exception as e:
+                        logger.warning("⚠️ Gemini tokenizer unavailable (%s); estimating tokens from length", e)
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def count_tokens(text: str, model_name: str = "gemini-2.5-flash") -> int:
+    """Input tokens for `text`: the local Gemini tokenizer if enabled, else a length estimate."""
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer(model_name)
+    if tokenizer is not None:
+        try:
+            return tokenizer.count_tokens(text).total_tokens
+        except Exception as e:
+            logger.warning("⚠️ Token count failed, estimating: %s", e)
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_passages(text: str, max_chars: int = PROMPT_PASSAGE_CHARS) -> list:
+    """
+    Splits text into passages on blank lines; paragraphs longer than max_chars are cut
+    at the last sentence end (or space) before the limit.
+
+    Returns:
+        list[tuple[int, int]]: (start, end) offsets into text, covering all of it.
+    """
+    bounds, start = [], 0
+    for m in list(PASSAGE_BREAK.finditer(text)) + [None]:
+        end = m.end() if m else len(text)
+        while end - start > max_chars:
+            cut = max((s.end() for s in SENTENCE_END.finditer(text, start + max_chars // 2, start + max_chars)),
+                      default=text.rfind(" ", start + 1, start + max_chars) + 1)
+            if cut <= start:
+                cut = start + max_chars
+            bounds.append((start, cut))
+            start = cut
+        if end > start:
+            bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _passage_scores(bounds: list, entities: list) -> list:
+    """
+    Relevance of each passage: every occurrence of a detected reference counts, a new
+    reference counts more, and passages next to a hit get a little of its score.
+    The opening passage (title, parties) and the last one (the order) get a bonus.
+    """
+    starts = [s for s, _ in bounds]
+    hits = [0.0] * len(bounds)
+    seen = [set() for _ in bounds]
+    for entity in entities or []:
+        for start, _ in entity.get("occurrences") or [[entity.get("start", -1), entity.get("end", -1)]]:
+            i = bisect.bisect_right(starts, start) - 1
+            if 0 <= i < len(bounds) and start < bounds[i][1]:
+                hits[i] += 1.0
+                seen[i].add(entity.get("canonical") or entity.get("reference"))
+
+    scores = [h + 2.0 * len(s) for h, s in zip(hits, seen)]
+    for i, score in enumerate(list(scores)):
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(scores) and score:
+                scores[j] += 0.25 * score
+    if scores:
+        scores[0] += 3.0
+        scores[-1] += 1.0
+    return scores
+
+
+def select_passages(text: str, entities: list, budget: int, model_name: str = "gemini-2.5-flash"):
+    """
+    Fits text into `budget` tokens. Text that already fits is returned unchanged;
+    otherwise the highest-scoring passages (see _passage_scores) are kept, in document
+    order, with OMISSION marking each gap.
+
+    Returns:
+        (text, info): info has "truncated", "passages_kept" and "passages_total".
+    """
+    if count_tokens(text, model_name) <= budget:
+        return text, {"truncated": False}
+
+    bounds = split_passages(text)
+    scores = _passage_scores(bounds, entities)
+    omission_tokens = count_tokens(OMISSION, model_name)
+
+    kept, used = set(), 0
+    for i in sorted(range(len(bounds)), key=lambda i: (-scores[i], i)):
+        cost = count_tokens(text[bounds[i][0]:bounds[i][1]], model_name) + omission_tokens
+        if used + cost <= budget:
+            kept.add(i)
+            used += cost
+
+    parts, previous = [], -1
+    for i in sorted(kept):
+        if i != previous + 1:
+            parts.append(OMISSION)
+        elif parts:
+            parts.append("\n\n")
+        parts.append(text[bounds[i][0]:bounds[i][1]].strip("\n"))
+        previous = i
+    if previous != len(bounds) - 1:
+        parts.append(OMISSION)
+
+    return "".join(parts).strip("\n"), {
+        "truncated": True,
+        "passages_kept": len(kept),
+        "passages_total": len(bounds),
+    }
+
+
+def build_prompt_inputs(prompt, raw_text: str, entities: list, context: str,
+                        budget: int = PROMPT_TOKEN_BUDGET, model_name: str = "gemini-2.5-flash"):
+    """
+    Prompt variables for the legal prompt, with the user's text included once and the
+    whole prompt kept within `budget` input tokens. Statute text may use at most half
+    of the budget; the document text gets the rest.
+
+    Returns:
+        (inputs, usage): inputs for prompt.invoke(); usage has "tokens_sent" (the
+        rendered prompt), "token_budget" and the select_passages info for the text.
+    """
+    names = [e.get("canonical", e["reference"]) for e in entities] if entities else []
+    context = context or "[No statute text resolved]"
+    context, context_info = select_passages(context, [], budget // 2, model_name)
+
+    inputs = {"query": "", "entities": names, "context": context}
+    fixed = count_tokens(render_prompt(prompt, inputs), model_name)
+    text, text_info = select_passages(raw_text or "", entities, max(budget - fixed, budget // 4), model_name)
+    inputs["query"] = text
+
+    usage = {
+        "tokens_sent": count_tokens(render_prompt(prompt, inputs), model_name),
+        "token_budget": budget,
+        **text_info,
+    }
+    if context_info["truncated"]:
+        usage["context_truncated"] = True
+    return inputs, usage
+
+
+def render_prompt(prompt, inputs: dict) -> str:
+    """The prompt as the model sees it (all messages), for counting tokens."""
+    return "\n".join(str(m.content) for m in prompt.format_messages(**inputs))
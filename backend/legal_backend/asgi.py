@@ -0,0 +1,176 @@
+"""
+Async (ASGI) serving mode. Same routes and JSON contracts as main.py, but Gemini and
+retrieval calls are awaited and extraction runs in a bounded thread pool, so a single
+process keeps hundreds of queries in flight instead of one per worker.
+
+    hypercorn legal_backend.asgi:app --bind 0.0.0.0:5000
+"""
+from quart import Quart, Request, request, jsonify
+from quart_cors import cors
+from werkzeug.exceptions import RequestEntityTooLarge
+import asyncio
+import os
+import sys
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from legal_backend.agent.legal_agent import process_query_async, astream_query, get_extraction_executor
+from legal_backend.services.upload_jobs import submit_upload, get_job, JobQueueFull
+from legal_backend.utils.response_tool import format_sse
+from legal_backend.bootstrap import start_bootstrap, is_ready, readiness
+from legal_backend.utils.file_source import make_upload_stream_factory, take_upload, discard_uploads, release_upload
+from legal_backend.utils.tracing import trace, timings_requested, metrics_available, metrics_response
+from legal_backend.config import UPLOAD_MAX_BYTES
+
+UPLOAD_FOLDER = os.path.join(project_root, 'uploads')
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+
+class UploadRequest(Request):
+    # Small uploads are parsed into memory, large ones written once straight into UPLOAD_FOLDER
+    def make_form_data_parser(self):
+        return self.form_data_parser_class(
+            max_content_length=self.max_content_length,
+            max_form_memory_size=self.max_form_memory_size,
+            max_form_parts=self.max_form_parts,
+            cls=self.parameter_storage_class,
+            stream_factory=make_upload_stream_factory(UPLOAD_FOLDER),
+        )
+
+
+app = Quart(__name__)
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
+app = cors(app, allow_origin=["http://localhost:3000"])
+
+
+@app.errorhandler(413)
+async def too_large(e):
+    return jsonify({"error": f"Upload exceeds the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit"}), 413
+
+
+@app.before_serving
+async def warm_up():
+    # Per-process models/clients + warmup query in the background; /api/ready is 503 until done
+    start_bootstrap()
+
+
+@app.route("/api/ready", methods=["GET"])
+async def ready():
+    return jsonify(readiness()), 200 if is_ready() else 503
+
+
+@app.route("/api/query", methods=["POST"])
+async def query():
+    try:
+        data = await request.get_json()
+        if not data or "query" not in data:
+            return jsonify({"error": "Missing 'query' field"}), 400
+
+        with trace("query") as request_trace:
+            result = await process_query_async(data["query"])
+        if timings_requested(data):
+            result = {**result, "timings": request_trace.timings()}
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/query/stream", methods=["POST"])
+async def query_stream():
+    data = await request.get_json()
+    if not data or "query" not in data:
+        return jsonify({"error": "Missing 'query' field"}), 400
+
+    async def events():
+        with trace("query_stream") as request_trace:
+            try:
+                async for event, payload in astream_query(data["query"]):
+                    if event == "result" and timings_requested(data):
+                        payload = {**payload, "timings": request_trace.timings()}
+                    yield format_sse(event, payload)
+            except Exception as e:
+                yield format_sse("error", {"error": str(e)})
+
+    return events(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+
+
+@app.route("/api/upload", methods=["POST"])
+async def upload_file():
+    try:
+        files = await request.files
+        if 'file' not in files:
+            discard_uploads(files)
+            return jsonify({"error": "No file part"}), 400
+
+        file = files['file']
+        if file.filename == '':
+            discard_uploads(files)
+            return jsonify({"error": "No selected file"}), 400
+
+        # The job owns (and deletes) a spooled file
+        source = take_upload(file)
+        discard_uploads(files)
+        try:
+            job_id = submit_upload(source, file.filename)
+        except BaseException:
+            # Not queued, so no job took ownership
+            release_upload(source)
+            raise
+
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except RequestEntityTooLarge:
+        # Let the 413 handler answer
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    if not metrics_available():
+        return jsonify({"error": "Metrics unavailable: install prometheus-client and set METRICS_ENABLED=true"}), 503
+    body, content_type = metrics_response()
+    return body, 200, {"Content-Type": content_type}
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+async def job_status(job_id):
+    job = await asyncio.get_running_loop().run_in_executor(get_extraction_executor(), get_job, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/api/contact", methods=["POST"])
+async def contact():
+    try:
+        data = await request.get_json()
+        required_fields = ["name", "email", "inquiryType", "message"]
+
+        if not data or not all(field in data for field in required_fields):
+            return jsonify({"error": "Missing required fields"}), 400
+
+        return jsonify({
+            "success": True,
+            "message": "Contact form submitted successfully"
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+if __name__ == "__main__":
+    import hypercorn.asyncio
+    from hypercorn.config import Config
+
+    hypercorn_config = Config()
+    hypercorn_config.bind = ["0.0.0.0:5000"]
+    asyncio.run(hypercorn.asyncio.serve(app, hypercorn_config))
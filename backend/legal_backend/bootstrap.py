@@ -0,0 +1,119 @@
+"""
+Per-worker startup for production serving.
+
+Creates the spaCy pipeline, Vision client, Gemini client and citation index once per
+worker process (after fork, so no gRPC channel or model state is shared with the
+master), then runs a warmup query through process_query. start_bootstrap() does this
+in a background thread, so the server is up meanwhile and /api/ready answers 503 until
+it has finished; a load balancer then never sends the first real request to a worker
+still loading models or doing TLS/gRPC handshakes.
+
+Started by backend/gunicorn.conf.py (post_worker_init), asgi.py (before_serving), the
+dev entry points (run.py, python -m legal_backend.main) and, failing those, by the
+first request to the Flask app.
+"""
+import os
+import time
+import base64
+import logging
+import threading
+
+from legal_backend.config import WARMUP_ENABLED, WARMUP_QUERY, WARMUP_VISION
+
+logger = logging.getLogger(__name__)
+
+# 1x1 white PNG, used to open the Vision channel without going through the OCR cache
+_WARMUP_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC"
+)
+
+_ready = threading.Event()
+_state = {"warmup_seconds": None, "warmup_error": None, "init_error": None}
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def init_worker():
+    """Builds this process's models and clients. Raises if a required resource is missing."""
+    from legal_backend.utils.ner_tools import get_nlp
+    from legal_backend.utils.ocr_tools import get_vision_client
+    from legal_backend.utils.citation_tools import get_citation_index
+    from legal_backend.agent.legal_agent import get_llm
+
+    get_nlp()
+    get_vision_client()
+    get_llm()
+    get_citation_index()
+
+
+def warmup():
+    """Runs one query end to end (NER, citation lookup, Gemini) and a tiny Vision call."""
+    from legal_backend.agent.legal_agent import process_query
+
+    if WARMUP_VISION:
+        from google.cloud import vision
+        from legal_backend.utils.ocr_tools import get_vision_client
+
+        get_vision_client().batch_annotate_images(requests=[vision.AnnotateImageRequest(
+            image=vision.Image(content=_WARMUP_PNG),
+            features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+        )])
+
+    result = process_query(WARMUP_QUERY, use_cache=False)  # a cache hit would skip the Gemini call
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+
+def bootstrap_worker():
+    """
+    init_worker() + warmup(), then marks the worker ready.
+    A failed init propagates (the worker must not become ready); a failed warmup is
+    logged and reported by readiness(), but the worker still becomes ready.
+    """
+    start = time.perf_counter()
+    init_worker()
+    if WARMUP_ENABLED:
+        try:
+            warmup()
+        except Exception as e:
+            _state["warmup_error"] = str(e)
+            logger.error("❌ Warmup failed: %s", e, exc_info=True)
+    _state["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    _ready.set()
+    logger.info("✅ Worker ready after %.2fs", _state["warmup_seconds"])
+
+
+def start_bootstrap() -> bool:
+    """
+    Runs bootstrap_worker() in a background thread, once per process (a forked child
+    starts its own). A failed init is logged and reported by readiness(); the worker
+    then stays not ready.
+
+    Returns:
+        bool: True if this call started it.
+    """
+    global _started_pid
+    if _started_pid == os.getpid():
+        return False
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return False
+        _started_pid = os.getpid()
+    threading.Thread(target=_bootstrap_in_background, name="bootstrap", daemon=True).start()
+    return True
+
+
+def _bootstrap_in_background():
+    try:
+        bootstrap_worker()
+    except Exception as e:
+        _state["init_error"] = str(e)
+        logger.error("❌ Worker init failed; /api/ready stays 503: %s", e, exc_info=True)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def readiness() -> dict:
+    return {"ready": is_ready(), **_state}
@@ -19,9 +19,109 @@ DEPLOYED_INDEX_ID = os.getenv("DEPLOYED_INDEX_ID")
 # Embedding model & batching
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
 EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))  # concurrent batch requests
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "300"))  # 0 = unlimited
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
 
 # Local output paths
 EMBEDDINGS_LOCAL_DIR = os.getenv("EMBEDDINGS_LOCAL_DIR", "data/embeddings")
 EMBEDDINGS_LOCAL_FILE = os.getenv("EMBEDDINGS_LOCAL_FILE", "data/embeddings/embeddings.jsonl")
+# Compiled, memory-mapped store built from EMBEDDINGS_LOCAL_FILE (services/local_index.py compile)
+EMBEDDINGS_STORE_DIR = os.getenv("EMBEDDINGS_STORE_DIR", "data/embeddings/store")
 
+# Retrieval backend: "vertex" (Matching Engine) or "local" (in-process NumPy index)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "vertex").lower()
 
+# Law corpus (JSON files) used for embeddings and the citation index
+LAWS_DATA_DIR = os.getenv("LAWS_DATA_DIR", "data/laws")
+
+# NER: "blank" = tokenizer-only spaCy pipeline, "model" = NER_SPACY_MODEL with unused pipes excluded
+NER_SPACY_MODE = os.getenv("NER_SPACY_MODE", "blank").lower()
+NER_SPACY_MODEL = os.getenv("NER_SPACY_MODEL", "en_core_web_sm")
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "32"))
+# Long texts are split into overlapping windows (on paragraph boundaries) before NER
+NER_WINDOW_CHARS = int(os.getenv("NER_WINDOW_CHARS", "100000"))
+NER_WINDOW_OVERLAP = int(os.getenv("NER_WINDOW_OVERLAP", "500"))
+NER_WORKERS = int(os.getenv("NER_WORKERS", "1"))  # nlp.pipe n_process
+
+# PDF extraction: processes for text-layer pages, threads for OCR calls
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", "8"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+# Vision OCR batching: images per batch_annotate_images call and max payload per call
+VISION_BATCH_SIZE = int(os.getenv("VISION_BATCH_SIZE", "16"))
+VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Persistent OCR result cache (SQLite, shared by all workers), keyed by image SHA-256
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/cache/ocr_cache.sqlite3")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+# Whole-document extraction cache (raw_text + entities), keyed by file content hash
+DOC_CACHE_ENABLED = os.getenv("DOC_CACHE_ENABLED", "true").lower() == "true"
+DOC_CACHE_PATH = os.getenv("DOC_CACHE_PATH", "data/cache/document_cache.sqlite3")
+DOC_CACHE_MAX_MB = int(os.getenv("DOC_CACHE_MAX_MB", "1024"))
+
+
+# DOCX → PDF fallback: pool of long-lived headless LibreOffice workers
+OFFICE_BINARY = os.getenv("OFFICE_BINARY", "soffice")
+OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", "2"))
+OFFICE_BASE_PORT = int(os.getenv("OFFICE_BASE_PORT", "2002"))  # worker i listens on base + i
+OFFICE_CONVERT_TIMEOUT = float(os.getenv("OFFICE_CONVERT_TIMEOUT", "120"))
+OFFICE_QUEUE_TIMEOUT = float(os.getenv("OFFICE_QUEUE_TIMEOUT", "300"))  # wait for a free worker
+
+# DOCX text extraction: "stream" (incremental XML parse) or "python-docx" (full DOM)
+DOCX_ENGINE = os.getenv("DOCX_ENGINE", "stream")
+
+# Async serving (asgi.py): threads running blocking extraction/NER off the event loop
+ASYNC_EXTRACTION_WORKERS = int(os.getenv("ASYNC_EXTRACTION_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+# Worker bootstrap (bootstrap.py): warmup run after each worker starts, before it reports ready
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "What does Section 302 IPC say about punishment for murder?")
+WARMUP_VISION = os.getenv("WARMUP_VISION", "true").lower() == "true"  # one tiny OCR call to open the gRPC channel
+
+# Answer cache in front of Gemini: exact tier (normalized query + entities) shared on disk,
+# optional per-process embedding-similarity tier
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/cache/answer_cache.sqlite3")
+ANSWER_CACHE_MAX_MB = int(os.getenv("ANSWER_CACHE_MAX_MB", "256"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_SEMANTIC_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SEMANTIC_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_SEMANTIC_MAX_CHARS = int(os.getenv("ANSWER_CACHE_SEMANTIC_MAX_CHARS", "2000"))
+
+# Upload jobs: /api/upload queues extraction on a local pool; state in SQLite for /api/jobs/<id>
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+UPLOAD_JOB_MAX_PENDING = int(os.getenv("UPLOAD_JOB_MAX_PENDING", "32"))  # per process, queued + running
+UPLOAD_JOB_DB_PATH = os.getenv("UPLOAD_JOB_DB_PATH", "data/jobs/upload_jobs.sqlite3")
+UPLOAD_JOB_TTL_SECONDS = int(os.getenv("UPLOAD_JOB_TTL_SECONDS", str(24 * 3600)))
+
+# Upload limits: bodies above UPLOAD_MAX_BYTES are rejected (413) before being buffered;
+# uploads up to UPLOAD_IN_MEMORY_MAX_BYTES are extracted from memory, larger ones spooled to disk once
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_IN_MEMORY_MAX_BYTES = int(os.getenv("UPLOAD_IN_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Prompt size: input-token budget per Gemini call. Longer document text is cut down to the
+# passages around detected references; "vertex" counts with the local Gemini tokenizer if installed
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "estimate").lower()
+PROMPT_PASSAGE_CHARS = int(os.getenv("PROMPT_PASSAGE_CHARS", "1500"))
+
+# Long-document mode: text over PROMPT_TOKEN_BUDGET is summarized map-reduce style (chunks summarized
+# in parallel, then merged hierarchically); "off" trims the text to the budget instead
+LONG_DOC_MODE = os.getenv("LONG_DOC_MODE", "auto").lower()
+LONG_DOC_CHUNK_TOKENS = int(os.getenv("LONG_DOC_CHUNK_TOKENS", "6000"))
+LONG_DOC_PARALLELISM = int(os.getenv("LONG_DOC_PARALLELISM", "8"))  # concurrent Gemini calls per document
+LONG_DOC_REDUCE_FANIN = int(os.getenv("LONG_DOC_REDUCE_FANIN", "8"))  # partial results merged per reduce call
+LONG_DOC_MAX_REDUCE_LEVELS = int(os.getenv("LONG_DOC_MAX_REDUCE_LEVELS", "4"))
+
+# Observability: per-stage latency/in-flight/error metrics on /metrics (needs prometheus-client; set
+# PROMETHEUS_MULTIPROC_DIR under gunicorn), a "timings" block in responses (always, or per request
+# with "timings": true), and OTLP trace export when an endpoint is set
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+TIMINGS_IN_RESPONSE = os.getenv("TIMINGS_IN_RESPONSE", "false").lower() == "true"
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "legal-lens-backend")
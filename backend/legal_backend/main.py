@@ -1,23 +1,43 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import sys
-import tempfile
 
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
-from legal_backend.agent.legal_agent import process_query
-from legal_backend.utils.input_router import input_router
-
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}})
+from legal_backend.agent.legal_agent import process_query, stream_query
+from legal_backend.services.upload_jobs import submit_upload, get_job, JobQueueFull
+from legal_backend.utils.response_tool import format_sse
+from legal_backend.bootstrap import start_bootstrap, is_ready, readiness
+from legal_backend.utils.file_source import make_upload_stream_factory, take_upload, discard_uploads, release_upload
+from legal_backend.utils.tracing import trace, timings_requested, metrics_available, metrics_response
+from legal_backend.config import UPLOAD_MAX_BYTES
 
 UPLOAD_FOLDER = os.path.join(project_root, 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+class UploadRequest(Request):
+    # Small uploads are parsed into memory, large ones written once straight into UPLOAD_FOLDER
+    _get_file_stream = staticmethod(make_upload_stream_factory(UPLOAD_FOLDER))
+
+app = Flask(__name__)
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES
+CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000"]}})
+
+@app.before_request
+def ensure_bootstrap():
+    # No-op once this process has started its bootstrap (gunicorn hook or dev entry point)
+    start_bootstrap()
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({"error": f"Upload exceeds the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit"}), 413
+
 @app.route("/api/query", methods=["POST"])
 def query():
     try:
@@ -26,38 +46,99 @@ def query():
             return jsonify({"error": "Missing 'query' field"}), 400
 
         user_query = data["query"]
-        result = process_query(user_query)
+        with trace("query") as request_trace:
+            result = process_query(user_query)
+        if timings_requested(data):
+            result = {**result, "timings": request_trace.timings()}
 
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/query/stream", methods=["POST"])
+def query_stream():
+    """
+    Same input as /api/query, answered as server-sent events:
+    "entities" (right after NER), "token"* (Gemini chunks), then "result"
+    (the /api/query response body) — or a single "error" event.
+    """
+    data = request.get_json(silent=True)
+    if not data or "query" not in data:
+        return jsonify({"error": "Missing 'query' field"}), 400
+
+    def events():
+        with trace("query_stream") as request_trace:
+            try:
+                for event, payload in stream_query(data["query"]):
+                    if event == "result" and timings_requested(data):
+                        payload = {**payload, "timings": request_trace.timings()}
+                    yield format_sse(event, payload)
+            except Exception as e:
+                yield format_sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/api/upload", methods=["POST"])
 def upload_file():
+    """
+    Queues extraction of the upload as a background job (no extra copy: small files
+    are handed over in memory, large ones as the file they were spooled to).
+    Returns 202 with a job id; poll GET /api/jobs/<job_id> for progress and the result.
+    """
     try:
         if 'file' not in request.files:
+            discard_uploads(request.files)
             return jsonify({"error": "No file part"}), 400
         
         file = request.files['file']
         if file.filename == '':
+            discard_uploads(request.files)
             return jsonify({"error": "No selected file"}), 400
 
-        if file:
-            # Create a temporary file to store the uploaded content
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-                file.save(tmp_file.name)
-                
-                # Process the file using input_router
-                result = input_router(tmp_file.name)
-                
-                # Clean up the temporary file
-                os.unlink(tmp_file.name)
-                
-                return jsonify(result), 200
+        # The job owns (and deletes) a spooled file
+        source = take_upload(file)
+        discard_uploads(request.files)
+        try:
+            job_id = submit_upload(source, file.filename)
+        except BaseException:
+            # Not queued, so no job took ownership
+            release_upload(source)
+            raise
 
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except RequestEntityTooLarge:
+        # Let the 413 handler answer
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    # 503 until this process has finished bootstrap/warmup (see bootstrap.py)
+    return jsonify(readiness()), 200 if is_ready() else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus scrape: per-stage latency histograms, in-flight gauges, error counters, cache stats
+    if not metrics_available():
+        return jsonify({"error": "Metrics unavailable: install prometheus-client and set METRICS_ENABLED=true"}), 503
+    body, content_type = metrics_response()
+    return Response(body, headers={"Content-Type": content_type})
+
 @app.route("/api/contact", methods=["POST"])
 def contact():
     try:
@@ -77,5 +158,8 @@ def contact():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
+    # Warm up in the background; under the debug reloader, only in the serving child
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_bootstrap()
     # Run API server
     app.run(host="0.0.0.0", port=5000, debug=True)
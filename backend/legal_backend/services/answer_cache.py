@@ -0,0 +1,224 @@
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from legal_backend.config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_MB, ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SEMANTIC, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_SEMANTIC_MAX_ENTRIES,
+    ANSWER_CACHE_SEMANTIC_MAX_CHARS, EMBEDDING_MODEL,
+)
+from legal_backend.utils.citation_tools import find_citations, format_citation
+from legal_backend.utils.disk_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Words that change the phrasing of a question but not what is being asked
+FILLER_WORDS = {
+    "a", "an", "the", "of", "is", "are", "what", "whats", "explain", "tell", "me", "about",
+    "does", "do", "say", "says", "please", "kindly", "define", "describe", "meaning",
+    "can", "you", "i", "want", "to", "know", "provision", "provisions", "details",
+}
+
+
+def _words(text: str) -> list:
+    """Case-folded words of any script; vowel signs and other combining marks stay in their word."""
+    return "".join(c if unicodedata.category(c)[0] in "LNM" else " " for c in text.casefold()).split()
+
+
+def normalize_query(text: str) -> str:
+    """
+    Phrasing-insensitive form of a query: citations rewritten to their canonical form,
+    case-folded, punctuation and filler words dropped. "what is article 21",
+    "Article 21 of constitution?" and "explain Art. 21" all become
+    "article 21 constitution". Non-Latin text ("दहेज कानून क्या है?") keeps its words.
+    """
+    parts, last = [], 0
+    for key, start, end in find_citations(text or ""):
+        parts.extend([text[last:start], f" {format_citation(key)} "])
+        last = end
+    parts.append((text or "")[last:])
+    words = _words("".join(parts))
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def entity_signature(entities: list) -> str:
+    """Order-independent canonical form of the NER entities."""
+    return "|".join(sorted({e.get("canonical") or e.get("reference", "") for e in entities or []}))
+
+
+class AnswerCache:
+    """
+    Cache of final query responses in front of the LLM.
+
+    - Exact tier: key = normalized query + canonical entities (+ a namespace that
+      changes with the prompt/model). Stored in a DiskLRUCache, so every worker
+      shares it; entries older than `ttl_seconds` are treated as misses.
+    - Semantic tier (optional): the query embedding is compared against recent
+      entries with the same entities; cosine >= `threshold` reuses that answer.
+      Kept in memory per process, LRU-bounded to `semantic_max_entries`.
+    """
+
+    def __init__(self, store: DiskLRUCache, ttl_seconds: float, namespace: str = "",
+                 semantic: bool = False, threshold: float = 0.95,
+                 semantic_max_entries: int = 5000, embed_fn=None):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.semantic = semantic
+        self.threshold = threshold
+        self.semantic_max_entries = semantic_max_entries
+        self._embed_fn = embed_fn
+        self._vectors = OrderedDict()  # key -> (entity signature, unit vector)
+        self._lock = threading.Lock()
+        self._stats = {"hits_exact": 0, "hits_semantic": 0, "misses": 0, "seconds_saved": 0.0}
+
+    def _key(self, normalized: str, signature: str) -> str:
+        digest = hashlib.sha256(f"{self.namespace}\n{normalized}\n{signature}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _embed(self, text: str):
+        if self._embed_fn is None:
+            from vertexai.language_models import TextEmbeddingModel
+            model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+            self._embed_fn = lambda t: model.get_embeddings([t])[0].values
+        vector = np.asarray(self._embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load(self, key: str):
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl_seconds:
+            self.store.delete(key)
+            with self._lock:
+                self._vectors.pop(key, None)
+            return None
+        return entry
+
+    def _semantic_match(self, vector, signature: str):
+        with self._lock:
+            candidates = [(key, vec) for key, (sig, vec) in self._vectors.items() if sig == signature]
+        if not candidates:
+            return None
+        scores = np.stack([vec for _, vec in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best][0] if scores[best] >= self.threshold else None
+
+    def get(self, raw_text: str, entities: list):
+        """
+        Returns a cached response (marked "cached": True) or None.
+        The response's query and entities are those of the current request.
+        """
+        start = time.perf_counter()
+        normalized, signature = normalize_query(raw_text), entity_signature(entities)
+        if not normalized:
+            # Nothing to tell queries apart by (only punctuation or filler words)
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        key = self._key(normalized, signature)
+        tier = "exact"
+        entry = self._load(key)
+
+        if entry is None and self.semantic and len(raw_text) <= ANSWER_CACHE_SEMANTIC_MAX_CHARS:
+            try:
+                match = self._semantic_match(self._embed(normalized), signature)
+                if match is not None:
+                    entry, tier = self._load(match), "semantic"
+                    key = match
+            except Exception as e:
+                logger.warning("⚠️ Semantic answer cache lookup failed: %s", e)
+
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats[f"hits_{tier}"] += 1
+            self._stats["seconds_saved"] += max(entry["llm_seconds"] - (time.perf_counter() - start), 0.0)
+            if key in self._vectors:
+                self._vectors.move_to_end(key)
+
+        response = dict(entry["response"])
+        response.update({"query": raw_text, "legal_entities": entities, "cached": True, "cache_tier": tier})
+        return response
+
+    def set(self, raw_text: str, entities: list, response: dict, llm_seconds: float):
+        """Stores a fresh response; llm_seconds is what a later hit saves."""
+        normalized, signature = normalize_query(raw_text), entity_signature(entities)
+        if not normalized:
+            return
+        key = self._key(normalized, signature)
+        self.store.set(key, {"response": response, "stored_at": time.time(), "llm_seconds": llm_seconds})
+
+        if self.semantic and len(raw_text) <= ANSWER_CACHE_SEMANTIC_MAX_CHARS:
+            try:
+                vector = self._embed(normalized)
+            except Exception as e:
+                logger.warning("⚠️ Could not embed query for the semantic answer cache: %s", e)
+                return
+            with self._lock:
+                self._vectors[key] = (signature, vector)
+                self._vectors.move_to_end(key)
+                while len(self._vectors) > self.semantic_max_entries:
+                    self._vectors.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit rate per tier and LLM time saved (this process) plus store size (all processes)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["semantic_entries"] = len(self._vectors)
+        lookups = stats["hits_exact"] + stats["hits_semantic"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits_exact"] + stats["hits_semantic"]) / lookups, 4) if lookups else 0.0
+        stats["seconds_saved"] = round(stats["seconds_saved"], 3)
+        store = self.store.stats()
+        stats.update({"entries": store["entries"], "bytes": store["bytes"], "max_bytes": store["max_bytes"]})
+        return stats
+
+
+def build_answer_cache(namespace: str):
+    """AnswerCache configured from config.py (None when ANSWER_CACHE_ENABLED is false)."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(
+        DiskLRUCache(ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_MB * 1024 * 1024),
+        ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+        namespace=namespace,
+        semantic=ANSWER_CACHE_SEMANTIC,
+        threshold=ANSWER_CACHE_SIMILARITY,
+        semantic_max_entries=ANSWER_CACHE_SEMANTIC_MAX_ENTRIES,
+    )
+
+
+if __name__ == "__main__":
+    # Regression check: distinct non-ASCII queries must not share a cache entry
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(DiskLRUCache(os.path.join(tmp, "answers.sqlite3"), 1024 * 1024), ttl_seconds=3600)
+        cache.set("दहेज कानून क्या है?", [], {"summary": "dowry law"}, 1.0)  # dowry law
+        cases = [
+            ("दहेज कानून क्या है?", "dowry law"),
+            ("दहेज  कानून क्या है", "dowry law"),  # same words, other spacing/punctuation
+            ("तलाक की प्रक्रिया क्या है?", None),  # divorce procedure
+            ("Qu'est-ce que l'article 21 ?", None),
+            ("?!", None),  # normalizes to "": never cached
+        ]
+        failures = 0
+        for query, expected in cases:
+            hit = cache.get(query, [])
+            got = hit["summary"] if hit else None
+            if got != expected:
+                failures += 1
+                print(f"❌ {query!r}: expected {expected}, got {got} ({normalize_query(query)!r})")
+        cache.set("?!", [], {"summary": "empty"}, 1.0)
+        if cache.store.stats()["entries"] != 1:
+            failures += 1
+            print("❌ an empty normalized query was stored")
+        print(f"✅ {len(cases) + 1 - failures}/{len(cases) + 1} answer cache cases passed")
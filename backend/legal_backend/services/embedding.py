@@ -1,14 +1,30 @@
 import os
 import json
+import time
+import shutil
+import hashlib
+import random
 import logging
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
+try:
+    import ijson  # optional: incremental JSON parsing for very large law files
+except ImportError:
+    ijson = None
+
+from google.api_core import exceptions as google_exceptions
 from google.cloud import aiplatform
 from vertexai.language_models import TextEmbeddingModel, TextEmbeddingInput
 
 # Import config (assuming this file exists with the necessary variables)
 try:
-    from legal_backend.config import PROJECT_ID, LOCATION, EMBEDDINGS_LOCAL_FILE, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE
+    from legal_backend.config import (
+        PROJECT_ID, LOCATION, EMBEDDINGS_LOCAL_FILE, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE,
+        EMBEDDING_MAX_IN_FLIGHT, EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_MAX_RETRIES,
+    )
 except ImportError:
     # Fallback for demonstration if config.py is not available
     PROJECT_ID = os.getenv("PROJECT_ID", "legal-lens-hackathon")
@@ -16,6 +32,23 @@ except ImportError:
     EMBEDDINGS_LOCAL_FILE = "embeddings.jsonl"
     EMBEDDING_MODEL = "text-embedding-004" # Use a modern model
     EMBEDDING_BATCH_SIZE = 5
+    EMBEDDING_MAX_IN_FLIGHT = 4
+    EMBEDDING_REQUESTS_PER_MINUTE = 300
+    EMBEDDING_MAX_RETRIES = 5
+
+# Upper bound on corpus items buffered per write segment (keeps fully-cached runs flat)
+MAX_SEGMENT_ITEMS = 1024
+
+# Errors worth retrying: quota, overload, timeouts and dropped connections
+TRANSIENT_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
@@ -28,31 +61,54 @@ def init_vertex(project_id=PROJECT_ID, location=LOCATION):
     aiplatform.init(project=project_id, location=location)
 
 
-def load_laws_from_folder(folder_path: str):
-    """Loads and combines all JSON law files from a folder."""
+def _iter_json_list(fpath: str):
+    """
+    Yields the elements of a file whose top level is a JSON list.
+    Uses ijson's incremental parser when installed so huge files never sit in memory;
+    otherwise falls back to json.load for that one file.
+    """
+    fname = os.path.basename(fpath)
+    with open(fpath, "rb") as f:
+        first = f.read(64).lstrip()[:1]
+        if first != b"[":
+            raise ValueError(f"{fname} does not contain a JSON list at top level.")
+        f.seek(0)
+
+        if ijson is not None:
+            yield from ijson.items(f, "item", use_float=True)
+        else:
+            yield from json.load(f)
+
+
+def iter_laws_from_folder(folder_path: str):
+    """
+    Streams law records from every JSON file in a folder, one record at a time.
+    Files are visited in sorted order so runs are deterministic.
+    """
     if not os.path.exists(folder_path):
         raise FileNotFoundError(f"{folder_path} not found.")
 
-    all_laws = []
-    for fname in os.listdir(folder_path):
+    total = 0
+    for fname in sorted(os.listdir(folder_path)):
         if fname.endswith(".json"):
             fpath = os.path.join(folder_path, fname)
-            with open(fpath, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    if not isinstance(data, list):
-                        raise ValueError(f"{fname} does not contain a JSON list at top level.")
-                    logging.info("Loaded %d law records from %s", len(data), fname)
-                    all_laws.extend(data)
-                except json.JSONDecodeError as e:
-                    logging.error("❌ JSONDecodeError in %s: %s", fname, e)
-                    raise
-                except Exception as e:
-                    logging.error("❌ Error in %s: %s", fname, e)
-                    raise
-
-    logging.info("Total combined records: %d", len(all_laws))
-    return all_laws
+            count = 0
+            try:
+                for record in _iter_json_list(fpath):
+                    count += 1
+                    yield record
+            except Exception as e:
+                logging.error("❌ Error in %s: %s", fname, e)
+                raise
+            logging.info("Loaded %d law records from %s", count, fname)
+            total += count
+
+    logging.info("Total combined records: %d", total)
+
+
+def load_laws_from_folder(folder_path: str):
+    """Loads and combines all JSON law files from a folder."""
+    return list(iter_laws_from_folder(folder_path))
 
 
 def get_embedding_model(model_name: str = EMBEDDING_MODEL):
@@ -78,62 +134,227 @@ def embed_batch(embed_model: TextEmbeddingModel, texts: list, task_type: str = "
         return []
 
 
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+    Refills at `rate_per_minute` tokens per minute and allows bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Blocks until `tokens` are available, then consumes them."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def embed_batch_with_retry(embed_model: TextEmbeddingModel, texts: list,
+                           task_type: str = "RETRIEVAL_DOCUMENT",
+                           rate_limiter: TokenBucket = None,
+                           max_retries: int = EMBEDDING_MAX_RETRIES,
+                           base_delay: float = 1.0, max_delay: float = 60.0):
+    """
+    Like embed_batch, but retries transient errors with exponential backoff + jitter
+    and raises once retries are exhausted instead of returning [].
+    """
+    embedding_inputs = [
+        TextEmbeddingInput(text, task_type=task_type) for text in texts
+    ]
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            emb_objs = embed_model.get_embeddings(embedding_inputs)
+            embeddings = [e.values for e in emb_objs]
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            logging.warning("⚠️ Transient embedding error (attempt %d/%d): %s — retrying in %.1fs",
+                            attempt + 1, max_retries + 1, e, delay)
+            time.sleep(delay)
+
+
+def law_to_text(item: dict) -> str:
+    """Concatenates the fields of one law record into the text that gets embedded."""
+    text_parts = [
+        item.get("act", ""),
+        f"Chapter {item.get('chapter')} - {item.get('chapter_title', '')}" if "chapter" in item else "",
+        f"Section {item.get('section')}: {item.get('title', item.get('section_title', ''))}",
+        item.get("description", item.get("section_desc", ""))
+    ]
+    return " ".join([p for p in text_parts if p]).strip()
+
+
+def record_hash(text: str, model_name: str) -> str:
+    """Stable cache key for one embedding: SHA-256 of the model name and embedded text."""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _index_existing_embeddings(paths: list, model_name: str) -> dict:
+    """
+    Maps record hash -> (path, byte offset) for every record already on disk.
+    Records written before hashes were stored are keyed by re-hashing their metadata.
+    """
+    index = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    try:
+                        rec = json.loads(line)
+                        h = rec.get("hash") or record_hash(law_to_text(rec.get("metadata", {})), model_name)
+                        index[h] = (path, offset)
+                    except (json.JSONDecodeError, AttributeError):
+                        logging.warning("Skipping unreadable line at %s:%d", path, offset)
+                offset += len(line)
+    return index
+
+
 def create_embeddings_jsonl(input_folder: str, output_jsonl: str,
                             batch_size: int = EMBEDDING_BATCH_SIZE,
-                            model_name: str = EMBEDDING_MODEL):
+                            model_name: str = EMBEDDING_MODEL,
+                            max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT,
+                            requests_per_minute: int = EMBEDDING_REQUESTS_PER_MINUTE,
+                            max_retries: int = EMBEDDING_MAX_RETRIES,
+                            embed_model=None):
     """
     Main function to load laws, create embeddings in batches, and save to a JSONL file.
+
+    Incremental: every record is keyed by record_hash(text, model_name). Records whose
+    hash is already on disk reuse the stored vector, only new or changed sections are
+    sent to the model, and sections no longer in the corpus are dropped.
+
+    Law records are streamed from disk, so the first batch is submitted as soon as it
+    is read and memory stays bounded by `max_in_flight` batches regardless of corpus size.
+    Up to `max_in_flight` batches are embedded concurrently (rate-limited to
+    `requests_per_minute`, transient errors retried). Output is written to
+    `<output>.tmp` in corpus order and atomically swapped in at the end; records from an
+    interrupted run are kept in `<output>.partial` and reused by the next run.
+    Pass `embed_model` to use an already-built (or fake) model instead of Vertex AI.
     """
-    init_vertex()
-    embed_model = get_embedding_model(model_name)
-    laws = load_laws_from_folder(input_folder)
-    total = len(laws)
+    if embed_model is None:
+        init_vertex()
+        embed_model = get_embedding_model(model_name)
+    laws = iter_laws_from_folder(input_folder)  # streamed; never fully in memory
     out_dir = os.path.dirname(output_jsonl) or "."
     os.makedirs(out_dir, exist_ok=True)
-    
+
     # The task type is set to RETRIEVAL_DOCUMENT as these are laws
     # which will be used for a retrieval-based system (e.g., Q&A).
     task_type = "RETRIEVAL_DOCUMENT"
 
-    # --- Resume logic ---
-    already_done = 0
-    if os.path.exists(output_jsonl):
-        with open(output_jsonl, "r", encoding="utf-8") as f:
-            already_done = sum(1 for _ in f)  # count lines
-        logging.info("Resuming: %d embeddings already written", already_done)
-
-    logging.info("Embedding %d items (remaining=%d) with batch_size=%d",
-                 total, total - already_done, batch_size)
-
-    with open(output_jsonl, "a", encoding="utf-8") as outf:
-        for start in range(already_done, total, batch_size):
-            batch = laws[start:start + batch_size]
-
-            # Concatenate fields for embedding
-            texts = []
-            for item in batch:
-                text_parts = [
-                    item.get("act", ""),
-                    f"Chapter {item.get('chapter')} - {item.get('chapter_title', '')}" if "chapter" in item else "",
-                    f"Section {item.get('section')}: {item.get('title', item.get('section_title', ''))}",
-                    item.get("description", item.get("section_desc", ""))
-                ]
-                text = " ".join([p for p in text_parts if p]).strip()
-                texts.append(text)
-
-            logging.info("Embedding items %d - %d", start, min(start + batch_size, total) - 1)
-            embeddings = embed_batch(embed_model, texts, task_type=task_type)
-
-            for idx, emb in enumerate(embeddings):
-                rec = {
-                    "id": batch[idx].get("id", f"rec_{start+idx}"),
-                    "embedding": emb,
-                    "metadata": batch[idx]
-                }
-                outf.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                outf.flush()  # ensure written even if interrupted
-
-    logging.info("✅ Finished writing embeddings to %s", output_jsonl)
+    # --- Incremental cache: previous output + records salvaged from interrupted runs ---
+    tmp_path = output_jsonl + ".tmp"
+    partial_path = output_jsonl + ".partial"
+    if os.path.exists(tmp_path):
+        with open(tmp_path, "rb") as src, open(partial_path, "ab") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(tmp_path)
+
+    cached = _index_existing_embeddings([output_jsonl, partial_path], model_name)
+    cache_files = {}
+
+    def read_cached(h):
+        path, offset = cached[h]
+        if path not in cache_files:
+            cache_files[path] = open(path, "rb")
+        f = cache_files[path]
+        f.seek(offset)
+        return json.loads(f.readline())["embedding"]
+
+    logging.info("Embedding %s (%d records cached on disk) with batch_size=%d, max_in_flight=%d",
+                 input_folder, len(cached), batch_size, max_in_flight)
+
+    rate_limiter = TokenBucket(requests_per_minute) if requests_per_minute else None
+    pending = deque()  # (segment, future) in corpus order
+    stats = {"reused": 0, "embedded": 0}
+
+    def write_oldest(outf):
+        segment, future = pending.popleft()
+        new_embeddings = iter(future.result())  # re-raises once retries are exhausted
+        for item, h in segment:
+            if h in cached:
+                emb = read_cached(h)
+                stats["reused"] += 1
+            else:
+                emb = next(new_embeddings)
+                stats["embedded"] += 1
+            rec = {
+                "id": item.get("id", f"rec_{h[:16]}"),
+                "hash": h,
+                "embedding": emb,
+                "metadata": item
+            }
+            outf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        outf.flush()  # ensure written even if interrupted
+
+    def submit(pool, segment, texts):
+        if texts:
+            future = pool.submit(embed_batch_with_retry, embed_model, texts, task_type,
+                                 rate_limiter, max_retries)
+            logging.info("Embedding %d new/changed items", len(texts))
+        else:
+            future = Future()
+            future.set_result([])
+        pending.append((segment, future))
+
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as outf, \
+                ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            try:
+                # A segment is a run of corpus items holding up to batch_size cache misses
+                # (and at most MAX_SEGMENT_ITEMS items overall)
+                segment, texts = [], []
+                for item in laws:
+                    text = law_to_text(item)
+                    h = record_hash(text, model_name)
+                    segment.append((item, h))
+                    if h not in cached:
+                        texts.append(text)
+                    if len(texts) >= batch_size or len(segment) >= MAX_SEGMENT_ITEMS:
+                        submit(pool, segment, texts)
+                        segment, texts = [], []
+                        if len(pending) >= max_in_flight:
+                            write_oldest(outf)
+                if segment:
+                    submit(pool, segment, texts)
+
+                while pending:
+                    write_oldest(outf)
+            except BaseException:
+                for _, future in pending:
+                    future.cancel()
+                raise
+    finally:
+        for f in cache_files.values():
+            f.close()
+
+    os.replace(tmp_path, output_jsonl)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    logging.info("✅ Finished writing embeddings to %s (reused=%d, embedded=%d)",
+                 output_jsonl, stats["reused"], stats["embedded"])
     return output_jsonl
 
 
@@ -143,12 +364,20 @@ if __name__ == "__main__":
     parser.add_argument("--output", default=EMBEDDINGS_LOCAL_FILE, help="Path to output embeddings.jsonl")
     parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
     parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--max-in-flight", type=int, default=EMBEDDING_MAX_IN_FLIGHT,
+                        help="Number of batch requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=EMBEDDING_REQUESTS_PER_MINUTE,
+                        help="Embedding requests per minute (0 = unlimited)")
+    parser.add_argument("--max-retries", type=int, default=EMBEDDING_MAX_RETRIES)
     args = parser.parse_args()
 
     try:
         out = create_embeddings_jsonl(args.input_folder, args.output,
                                      batch_size=args.batch_size,
-                                     model_name=args.model)
+                                     model_name=args.model,
+                                     max_in_flight=args.max_in_flight,
+                                     requests_per_minute=args.rpm,
+                                     max_retries=args.max_retries)
         print("Wrote embeddings file:", out)
     except Exception as e:
         logging.error("An error occurred during embedding creation: %s", e)
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import subprocess
+import time
+
+import numpy as np
+
+from legal_backend.config import EMBEDDINGS_LOCAL_FILE, EMBEDDINGS_STORE_DIR
+
+# File names inside a compiled embedding store directory
+STORE_VECTORS = "vectors.npy"
+STORE_IDS = "ids.npy"
+STORE_METADATA = "metadata.jsonl"
+STORE_OFFSETS = "metadata_offsets.npy"
+STORE_MANIFEST = "manifest.json"
+
+# Rows per block when scoring a float16 store (bounds the float32 upcast)
+SCORE_BLOCK_ROWS = 65536
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+
+class LocalVectorIndex:
+    """
+    Exact (brute-force) cosine index over the embeddings produced by services/embedding.py.
+
+    All vectors live in one contiguous, L2-normalised matrix (float32 in memory, or a
+    memory-mapped float32/float16 store), so a top-k query is a single matrix-vector
+    product followed by an argpartition.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids, metadata, normalized: bool = False):
+        if len(vectors) != len(ids) or len(ids) != len(metadata):
+            raise ValueError("vectors, ids and metadata must have the same length.")
+
+        # Pre-normalised stores (e.g. a read-only memmap) are used as-is, without a copy
+        if not normalized:
+            vectors = _normalize(np.ascontiguousarray(vectors, dtype=np.float32))
+        self.vectors = vectors
+        self.ids = ids
+        self.metadata = metadata
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """Loads either a compiled store directory or a raw embeddings.jsonl file."""
+        if os.path.isdir(path):
+            return cls.from_store(path)
+        return cls.from_jsonl(path)
+
+    @classmethod
+    def from_store(cls, store_dir: str = EMBEDDINGS_STORE_DIR) -> "LocalVectorIndex":
+        """
+        Opens a store written by compile_embedding_store().
+        Vectors and ids are memory-mapped read-only, so nothing is parsed or copied at
+        startup and every worker process shares the same page cache.
+        """
+        with open(os.path.join(store_dir, STORE_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        vectors = np.load(os.path.join(store_dir, STORE_VECTORS), mmap_mode="r")
+        ids = np.load(os.path.join(store_dir, STORE_IDS), mmap_mode="r")
+        metadata = MetadataSidecar(store_dir)
+        logger.info("Opened embedding store %s (count=%d, dim=%d, dtype=%s)",
+                    store_dir, manifest["count"], manifest["dim"], manifest["dtype"])
+        return cls(vectors, ids, metadata, normalized=True)
+
+    @classmethod
+    def from_jsonl(cls, jsonl_path: str = EMBEDDINGS_LOCAL_FILE) -> "LocalVectorIndex":
+        """Loads an embeddings.jsonl file (one {"id", "embedding", "metadata"} record per line)."""
+        ids, metadata, rows = [], [], []
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                ids.append(rec["id"])
+                metadata.append(rec.get("metadata", {}))
+                rows.append(rec["embedding"])
+
+        vectors = np.asarray(rows, dtype=np.float32)
+        logger.info("Loaded %d embeddings (dim=%d) from %s",
+                    len(ids), vectors.shape[1] if vectors.ndim == 2 else 0, jsonl_path)
+        return cls(vectors, ids, metadata)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    def search(self, query_vector, k: int = 3) -> list:
+        """
+        Returns the top-k neighbours of one query vector.
+
+        Returns:
+            list[tuple[int, float]]: (row, cosine similarity) pairs, best first.
+        """
+        return self.search_batch([query_vector], k=k)[0]
+
+    def search_batch(self, query_vectors, k: int = 3) -> list:
+        """
+        Returns the top-k neighbours for many query vectors with one matrix product.
+
+        Returns:
+            list[list[tuple[int, float]]]: one result list per query, in input order.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        if len(self) == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+
+        k = min(k, len(self))
+        scores = self._scores(queries)  # (n_queries, n_docs)
+
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(int(row), float(score)) for row, score in zip(rows, row_scores)]
+            for rows, row_scores in zip(top, top_scores)
+        ]
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.vectors.dtype == np.float32:
+            return queries @ self.vectors.T
+
+        # Reduced-precision store: upcast one block at a time
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+
+class MetadataSidecar:
+    """
+    Read-only, list-like view over a store's metadata.jsonl.
+    Only the rows that are actually returned by a search get parsed.
+    """
+
+    def __init__(self, store_dir: str):
+        self.path = os.path.join(store_dir, STORE_METADATA)
+        self.offsets = np.load(os.path.join(store_dir, STORE_OFFSETS), mmap_mode="r")
+        # Mapped like the vectors, so concurrent reads need no file position (or os.pread,
+        # which Windows lacks); an empty file cannot be mapped
+        if os.path.getsize(self.path):
+            self._data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        else:
+            self._data = np.empty(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._data[start:end].tobytes())
+
+
+def compile_embedding_store(jsonl_path: str = EMBEDDINGS_LOCAL_FILE,
+                            store_dir: str = EMBEDDINGS_STORE_DIR,
+                            dtype: str = "float32") -> str:
+    """
+    Compiles embeddings.jsonl into a columnar store:
+      - vectors.npy           L2-normalised (count, dim) matrix, float32 or float16
+      - ids.npy               record ids
+      - metadata.jsonl        one metadata object per row
+      - metadata_offsets.npy  byte offsets into metadata.jsonl (count + 1 entries)
+      - manifest.json         count, dim, dtype and source file
+
+    Streams the input twice (count, then fill) so memory stays flat.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError("dtype must be 'float32' or 'float16'.")
+    if not os.path.exists(jsonl_path):
+        raise FileNotFoundError(f"{jsonl_path} not found.")
+
+    count, dim = 0, 0
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if count == 0:
+                dim = len(json.loads(line)["embedding"])
+            count += 1
+
+    os.makedirs(store_dir, exist_ok=True)
+    vectors = np.lib.format.open_memmap(
+        os.path.join(store_dir, STORE_VECTORS), mode="w+", dtype=dtype, shape=(count, dim)
+    )
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    ids = []
+
+    with open(jsonl_path, "r", encoding="utf-8") as f, \
+            open(os.path.join(store_dir, STORE_METADATA), "wb") as metaf:
+        row = 0
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            vectors[row] = _normalize(np.asarray([rec["embedding"]], dtype=np.float32))[0]
+            ids.append(str(rec["id"]))
+            metaf.write(json.dumps(rec.get("metadata", {}), ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets[row + 1] = metaf.tell()
+            row += 1
+
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(store_dir, STORE_IDS), np.asarray(ids, dtype=str))
+    np.save(os.path.join(store_dir, STORE_OFFSETS), offsets)
+
+    with open(os.path.join(store_dir, STORE_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "dim": dim, "dtype": dtype, "source": jsonl_path}, f, indent=2)
+
+    logger.info("✅ Compiled %d embeddings (dim=%d, %s) into %s", count, dim, dtype, store_dir)
+    return store_dir
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc, falls back to peak RSS)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_stats(path: str) -> dict:
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    index = LocalVectorIndex.load(path)
+    index.search(np.ones(index.dim, dtype=np.float32), k=3)
+    return {
+        "path": path,
+        "count": len(index),
+        "load_seconds": round(time.perf_counter() - start, 4),
+        "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalises rows so dot products are cosine similarities."""
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local vector index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_compile = sub.add_parser("compile", help="Compile embeddings.jsonl into a memory-mapped store")
+    p_compile.add_argument("--embeddings", default=EMBEDDINGS_LOCAL_FILE, help="Path to embeddings.jsonl")
+    p_compile.add_argument("--store", default=EMBEDDINGS_STORE_DIR, help="Output store directory")
+    p_compile.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+
+    p_bench = sub.add_parser("bench", help="Compare startup time/RSS and time top-k queries")
+    p_bench.add_argument("--embeddings", default=EMBEDDINGS_LOCAL_FILE, help="Path to embeddings.jsonl")
+    p_bench.add_argument("--store", default=EMBEDDINGS_STORE_DIR, help="Compiled store directory")
+    p_bench.add_argument("--k", type=int, default=3)
+    p_bench.add_argument("--queries", type=int, default=100, help="Number of random queries to time")
+
+    p_stats = sub.add_parser("load-stats", help=argparse.SUPPRESS)
+    p_stats.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        print("Wrote embedding store:", compile_embedding_store(args.embeddings, args.store, args.dtype))
+
+    elif args.command == "load-stats":
+        print(json.dumps(_load_stats(args.path)))
+
+    elif args.command == "bench":
+        # Each load runs in a fresh interpreter so startup time and RSS are not shared
+        for path in (args.embeddings, args.store):
+            if not os.path.exists(path):
+                print(f"Skipping {path} (not found)")
+                continue
+            out = subprocess.run(
+                [sys.executable, "-m", "legal_backend.services.local_index", "load-stats", path],
+                capture_output=True, text=True, check=True,
+            )
+            print(out.stdout.strip())
+
+        index = LocalVectorIndex.load(args.store if os.path.isdir(args.store) else args.embeddings)
+        rng = np.random.default_rng(0)
+        queries = rng.standard_normal((args.queries, index.dim)).astype(np.float32)
+
+        start = time.perf_counter()
+        for q in queries:
+            index.search(q, k=args.k)
+        single = (time.perf_counter() - start) / args.queries
+
+        start = time.perf_counter()
+        index.search_batch(queries, k=args.k)
+        batched = (time.perf_counter() - start) / args.queries
+
+        print(f"search():       {single * 1000:.3f} ms/query")
+        print(f"search_batch(): {batched * 1000:.3f} ms/query")
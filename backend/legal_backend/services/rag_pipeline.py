@@ -1,5 +1,5 @@
 import logging
-from legal_backend.utils.retrival_tool import VertexAIRetriever
+from legal_backend.utils.retrival_tool import get_retriever
 from legal_backend.utils.response_tool import generate_response_from_context
 
 logger = logging.getLogger(__name__)
@@ -19,7 +19,7 @@ def main():
     """
     try:
         # Step 1: Initialize retriever
-        retriever = VertexAIRetriever(k=3)
+        retriever = get_retriever(k=3)
 
         # Step 2: Hardcoded test query
         user_query = "Indian Penal Code Chapter 1 section 2 definition of crime"
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from legal_backend.utils.tracing import span
+from legal_backend.config import (
+    UPLOAD_JOB_WORKERS, UPLOAD_JOB_MAX_PENDING, UPLOAD_JOB_DB_PATH, UPLOAD_JOB_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Attempts for a job-state write that finds the database locked or busy
+WRITE_ATTEMPTS = 3
+
+
+class JobQueueFull(Exception):
+    """Raised when UPLOAD_JOB_MAX_PENDING jobs are already queued or running in this process."""
+
+
+class JobStore:
+    """
+    Upload job state in a local SQLite file, so any web worker can answer
+    GET /api/jobs/<id> for a job running in another worker.
+    A failure that cannot be written is kept in memory: get() in this process reports
+    it and writes it again, so a job never stays "running" after its thread ended.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._unsaved_failures = {}  # job_id -> error whose write failed
+        self._unsaved_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, filename TEXT, status TEXT NOT NULL, pid INTEGER,"
+            " pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER,"
+            " result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, job_id: str, **fields):
+        """Writes job fields, retrying a locked database. Raises sqlite3.Error if every attempt fails."""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                self._conn().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == WRITE_ATTEMPTS:
+                    raise
+                logger.warning("⚠️ Job store update failed for %s (attempt %d): %s", job_id, attempt, e)
+                time.sleep(0.1 * attempt)
+
+    def create(self, filename: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, filename, status, pid, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, filename, os.getpid(), now, now),
+        )
+        return job_id
+
+    def start(self, job_id: str):
+        self._update(job_id, status="running")
+
+    def progress(self, job_id: str, pages_done: int, pages_total: int):
+        # Best effort: a missed progress write must not fail the extraction
+        try:
+            self._update(job_id, pages_done=pages_done, pages_total=pages_total)
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Progress update failed for %s: %s", job_id, e)
+
+    def finish(self, job_id: str, result: dict):
+        self._update(job_id, status="done", result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id: str, error: str):
+        """Marks the job failed; if that cannot be written, remembers it in memory (never raises)."""
+        try:
+            self._update(job_id, status="failed", error=error)
+        except sqlite3.Error as e:
+            logger.error("❌ Could not save failure of job %s: %s", job_id, e)
+            with self._unsaved_lock:
+                self._unsaved_failures[job_id] = error
+            return
+        with self._unsaved_lock:
+            self._unsaved_failures.pop(job_id, None)
+
+    def get(self, job_id: str):
+        """Job as a JSON-ready dict, or None. Jobs whose worker process died are reported failed."""
+        row = self._conn().execute(
+            "SELECT id, filename, status, pid, pages_done, pages_total, result, error, created_at, updated_at"
+            " FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, filename, status, pid, done, total, result, error, created_at, updated_at = row
+
+        with self._unsaved_lock:
+            unsaved = self._unsaved_failures.get(job_id)
+        if unsaved is not None:
+            status, error = "failed", unsaved
+            self.fail(job_id, error)  # retry the write
+        elif status in ACTIVE_STATUSES and not _pid_alive(pid):
+            status, error = "failed", "Worker process exited before the job finished."
+            self.fail(job_id, error)
+
+        return {
+            "job_id": job_id,
+            "filename": filename,
+            "status": status,
+            "progress": {"pages_done": done, "pages_total": total},
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def purge(self, older_than: float):
+        """Deletes finished jobs last updated more than `older_than` seconds ago."""
+        try:
+            self._conn().execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?",
+                (time.time() - older_than,),
+            )
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Job store purge failed: %s", e)
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return _pid_alive_windows(pid)  # os.kill(pid, 0) would terminate the process there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _pid_alive_windows(pid: int) -> bool:
+    import ctypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION, STILL_ACTIVE, ERROR_ACCESS_DENIED = 0x1000, 259, 5
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED  # exists, owned by someone else
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+job_store = JobStore(UPLOAD_JOB_DB_PATH)
+
+_executor = None
+_executor_pid = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Per-process job pool, created on first submit (after any fork)."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _run_job(job_id: str, source, filename: str):
+    global _pending
+    from legal_backend.utils.input_router import route_input
+
+    try:
+        job_store.start(job_id)
+        with span("upload_job"):
+            result = route_input(source, progress=lambda done, total: job_store.progress(job_id, done, total),
+                                 filename=filename)
+        if "error" in result:
+            job_store.fail(job_id, result["error"])
+        else:
+            result["source"] = filename
+            job_store.finish(job_id, result)
+    except Exception as e:
+        logger.error("❌ Upload job %s failed: %s", job_id, e, exc_info=True)
+        job_store.fail(job_id, f"Unexpected error: {str(e)}")
+    finally:
+        if isinstance(source, str) and os.path.exists(source):
+            os.unlink(source)
+        elif hasattr(source, "close"):
+            source.close()
+        with _lock:
+            _pending -= 1
+
+
+def submit_upload(source, filename: str) -> str:
+    """
+    Queues extraction of an upload and returns its job id right away.
+    `source` is the upload's in-memory stream (small uploads) or the path of its
+    spooled file; the job owns either and closes or deletes it when done.
+
+    Raises:
+        JobQueueFull: if this process already has UPLOAD_JOB_MAX_PENDING jobs.
+    """
+    global _pending
+    with _lock:
+        if _executor_pid != os.getpid():
+            _pending = 0  # a forked worker does not inherit the parent's jobs
+        if _pending >= UPLOAD_JOB_MAX_PENDING:
+            raise JobQueueFull(f"{_pending} upload jobs already pending; try again later.")
+        _pending += 1
+        executor = _get_executor()
+
+    try:
+        job_id = job_store.create(filename)
+        executor.submit(_run_job, job_id, source, filename)
+    except Exception:
+        with _lock:
+            _pending -= 1
+        raise
+    job_store.purge(UPLOAD_JOB_TTL_SECONDS)
+    return job_id
+
+
+def get_job(job_id: str):
+    return job_store.get(job_id)
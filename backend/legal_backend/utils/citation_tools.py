@@ -0,0 +1,341 @@
+import os
+import re
+import logging
+import threading
+from collections import namedtuple
+
+from legal_backend.config import LAWS_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Canonical key for one provision, e.g. CitationKey("IPC", "section", "302", "(1)")
+CitationKey = namedtuple("CitationKey", ["act", "kind", "number", "subclause"])
+
+# Alias (lower-case, punctuation stripped) -> canonical act code
+ACT_ALIASES = {
+    "ipc": "IPC",
+    "indian penal code": "IPC",
+    "penal code": "IPC",
+    "crpc": "CrPC",
+    "code of criminal procedure": "CrPC",
+    "criminal procedure code": "CrPC",
+    "cpc": "CPC",
+    "code of civil procedure": "CPC",
+    "civil procedure code": "CPC",
+    "it act": "IT Act",
+    "information technology act": "IT Act",
+    "ni act": "NI Act",
+    "negotiable instruments act": "NI Act",
+    "evidence act": "Evidence Act",
+    "indian evidence act": "Evidence Act",
+    "iea": "Evidence Act",
+    "bns": "BNS",
+    "bharatiya nyaya sanhita": "BNS",
+    "bnss": "BNSS",
+    "bharatiya nagarik suraksha sanhita": "BNSS",
+    "bsa": "BSA",
+    "bharatiya sakshya adhiniyam": "BSA",
+    "constitution": "Constitution",
+    "constitution of india": "Constitution",
+    "indian constitution": "Constitution",
+}
+
+KIND_ALIASES = {
+    "section": "section", "sections": "section", "sec": "section", "s": "section", "ss": "section",
+    "u/s": "section", "u/ss": "section",
+    "article": "article", "articles": "article", "art": "article", "arts": "article",
+    "rule": "rule", "rules": "rule", "r": "rule",
+    "order": "order", "o": "order",
+}
+
+
+def _alias_pattern(alias: str) -> str:
+    """Regex for one alias; short abbreviations also match dotted forms ("Cr.P.C.", "N.I. Act")."""
+    words = []
+    for word in alias.split():
+        if len(word) <= 4 and word != "act":
+            words.append(r"\.?\s?".join(re.escape(ch) for ch in word) + r"\.?")
+        else:
+            words.append(re.escape(word))
+    return r"\s*".join(words)
+
+
+_ACT_PATTERN = "|".join(_alias_pattern(alias) for alias in sorted(ACT_ALIASES, key=len, reverse=True))
+
+# "302", "120B", "498-A" (the letter is part of the number: 498A is not 498)
+_NUMBER = r"\d+(?:-?[A-Z](?![A-Z]))?"
+_SUBCLAUSE = r"(?:\s*\(\s*[0-9a-z]+\s*\))*"
+_ACT = r"(?:\s*,?\s*(?:of\s+)?(?:the\s+)?(?P<act>" + _ACT_PATTERN + r")\b\.?)?"
+
+# Short forms need their dot ("s. 302", "O. 7") or a capital right before the number
+# ("S 302"), so "it's 5 pm" or "appellant's 2 brothers" are not citations. Plural
+# forms take a list ("Sections 302 and 304 IPC", "ss. 34, 120B"). Orders may be
+# numbered in Roman numerals ("Order XXXIX Rule 1 CPC").
+CITATION_REGEX = re.compile(
+    r"(?<![\w'’])"
+    r"(?P<kind>(?P<plural>sections|ss\.|u/ss\.?|articles|arts\.|rules)"
+    r"|section|sec|u/s|article|art|rule|(?P<order>order|o\.)|s\.|r\.|(?-i:S|R|O)(?=\s*\d))\.?\s*"
+    r"(?P<number>" + _NUMBER + r"|(?(order)(?-i:[IVXLC]+)\b|(?!)))"
+    r"(?P<subclause>" + _SUBCLAUSE + r")"
+    r"(?(plural)(?P<more>(?:\s*(?:,\s*(?:and\s+)?|and\s+|&\s*)" + _NUMBER + _SUBCLAUSE + r")*)"
+    r"|(?:\s*(?:rule|r\.)\s*(?P<rule>" + _NUMBER + r"))?)"
+    + _ACT,
+    re.IGNORECASE,
+)
+_LIST_ITEM = re.compile(r"(?P<number>" + _NUMBER + r")(?P<subclause>" + _SUBCLAUSE + r")", re.IGNORECASE)
+
+# "r/w 120B IPC", "read with Section 34": a further provision of the same kind and act
+_READ_WITH = re.compile(
+    r"\s*(?:r/w|read\s+with)\s*(?:(?:sections?|sec\.?|ss?\.|u/s)\s*)?"
+    r"(?P<number>" + _NUMBER + r")(?P<subclause>" + _SUBCLAUSE + r")" + _ACT,
+    re.IGNORECASE,
+)
+_ROMAN = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100}
+
+
+def normalize_act(name: str) -> str:
+    """Maps an act name or abbreviation to its canonical code ("" if empty)."""
+    if not name:
+        return ""
+    cleaned = re.sub(r"[^a-z ]", "", re.sub(r"\s+", " ", name.lower())).strip()
+    cleaned = re.sub(r",?\s*\d{4}$", "", cleaned).strip()  # drop trailing year
+    cleaned = re.sub(r"^the ", "", cleaned)
+    return ACT_ALIASES.get(cleaned, name.strip())
+
+
+def _canonical_number(raw: str) -> str:
+    """"498-A" -> "498A", Roman "XXXIX" -> "39"."""
+    number = re.sub(r"[\s-]", "", raw).upper()
+    if re.fullmatch(r"[IVXLC]+", number):
+        values = [_ROMAN[ch] for ch in number]
+        number = str(sum(-v if v < nxt else v for v, nxt in zip(values, values[1:] + [0])))
+    return number
+
+
+def _canonical_subclause(raw: str) -> str:
+    return re.sub(r"\s+", "", raw or "").lower()
+
+
+def _to_key(match, number=None, subclause=None) -> CitationKey:
+    kind = KIND_ALIASES[match.group("kind").lower().rstrip(".")]
+    number = _canonical_number(number or match.group("number"))
+    subclause = _canonical_subclause(subclause if subclause is not None else match.group("subclause"))
+    if kind == "order" and match.group("rule"):
+        subclause = f"rule {_canonical_number(match.group('rule'))}{subclause}"
+
+    act = normalize_act(match.group("act") or "")
+    if not act and kind == "article":
+        act = "Constitution"
+    return CitationKey(act, kind, number, subclause)
+
+
+def _citations(match) -> list:
+    """(CitationKey, start, end) for one regex match; a plural list gives one entry per number."""
+    kind = KIND_ALIASES[match.group("kind").lower().rstrip(".")]
+    if kind in ("rule", "order") and not (match.group("act") or match.group("rule")):
+        return []  # "Rule 5 of thumb", "in order 2 days": only cited with an act (or as Order X Rule Y)
+    if not match.group("more"):
+        return [(_to_key(match), match.start(), match.end())]
+
+    items = [(match.group("number"), match.group("subclause"), match.start(), match.end("subclause"))]
+    for item in _LIST_ITEM.finditer(match.group(0), match.start("more") - match.start(), match.end("more") - match.start()):
+        items.append((item.group("number"), item.group("subclause"),
+                      match.start() + item.start(), match.start() + item.end()))
+    found = [(_to_key(match, number, subclause), start, end) for number, subclause, start, end in items]
+    key, start, _ = found[-1]
+    found[-1] = (key, start, match.end())  # the last item carries the act name
+    return found
+
+
+def normalize_citation(text: str):
+    """
+    Normalizes one citation string to its canonical key.
+    "Sec. 302 IPC", "S.302", "Section 302 of the Indian Penal Code" all share the key
+    (IPC, section, 302, ""); the act is "" when the text does not name one.
+
+    Returns:
+        CitationKey | None: None if the text contains no citation.
+    """
+    for key, _, _ in find_citations(text):
+        return key
+    return None
+
+
+def find_citations(text: str) -> list:
+    """
+    Returns (CitationKey, start, end) for every citation in a text, in order.
+    Provisions joined by "r/w" / "read with" share their kind and act: "Section 420
+    r/w 120B IPC" gives Section 420 IPC and Section 120B IPC.
+    """
+    if not text:
+        return []
+    found, pos = [], 0
+    while True:
+        match = CITATION_REGEX.search(text, pos)
+        if match is None:
+            return found
+        group, pos = _citations(match), match.end()
+        while group:
+            joined = _READ_WITH.match(text, pos)
+            if joined is None:
+                break
+            head = group[-1][0]
+            key = CitationKey(normalize_act(joined.group("act") or "") or head.act, head.kind,
+                              _canonical_number(joined.group("number")),
+                              _canonical_subclause(joined.group("subclause")))
+            group.append((key, joined.start("number"), joined.end()))
+            pos = joined.end()
+
+        # An act named after "r/w" applies to the provisions before it as well
+        act = ""
+        for i in range(len(group) - 1, -1, -1):
+            key, start, end = group[i]
+            if key.act:
+                act = key.act
+            elif act:
+                group[i] = (key._replace(act=act), start, end)
+        found.extend(group)
+
+
+def format_citation(key: CitationKey) -> str:
+    """Human-readable form of a key, e.g. "Section 302(1) IPC"."""
+    sub = key.subclause if key.subclause.startswith("(") else (f" {key.subclause.title()}" if key.subclause else "")
+    label = f"{key.kind.title()} {key.number}{sub}"
+    return f"{label} {key.act}".strip()
+
+
+class CitationIndex:
+    """
+    Hash index from CitationKey to law records, built from the JSON files in data/laws.
+    An explicit citation resolves with a dictionary lookup; no embedding or ANN call.
+    """
+
+    def __init__(self, records=()):
+        self.by_key = {}
+        self.by_provision = {}  # (kind, number) -> keys, for citations that name no act
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def key_for_record(record: dict):
+        """Canonical key for one law record (None if it has no section/article number)."""
+        kind = "article" if record.get("article") is not None else "section"
+        raw = record.get("article", record.get("section"))
+        if raw is None:
+            return None
+        number = _canonical_number(re.sub(r"^(section|sec|article|art)\.?\s*", "", str(raw).strip(),
+                                          flags=re.IGNORECASE))
+        if not number:
+            return None
+        act = normalize_act(record.get("act", ""))
+        if not act and kind == "article":
+            act = "Constitution"
+        return CitationKey(act, kind, number, "")
+
+    def add(self, record: dict):
+        key = self.key_for_record(record)
+        if key is None:
+            return
+        self.by_key.setdefault(key, []).append(record)
+        keys = self.by_provision.setdefault((key.kind, key.number), [])
+        if key not in keys:
+            keys.append(key)
+
+    def __len__(self) -> int:
+        return len(self.by_key)
+
+    def lookup(self, citation) -> list:
+        """
+        Resolves a citation (string or CitationKey) to the matching law records.
+        Sub-clauses fall back to the whole provision; a citation with no act returns
+        the provision from every act that has it.
+        """
+        key = normalize_citation(citation) if isinstance(citation, str) else citation
+        if key is None:
+            return []
+
+        base = CitationKey(key.act, key.kind, key.number, "")
+        if key.act:
+            return list(self.by_key.get(key, self.by_key.get(base, [])))
+
+        records = []
+        for candidate in self.by_provision.get((key.kind, key.number), []):
+            records.extend(self.by_key[candidate])
+        return records
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_citation_index(laws_dir: str = LAWS_DATA_DIR) -> CitationIndex:
+    """Builds the process-wide CitationIndex on first use (empty if the folder is missing)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if not os.path.isdir(laws_dir):
+                    logger.warning("⚠️ Law data folder %s not found; citation index is empty.", laws_dir)
+                    _index = CitationIndex()
+                else:
+                    from legal_backend.services.embedding import iter_laws_from_folder
+                    _index = CitationIndex(iter_laws_from_folder(laws_dir))
+                    logger.info("✅ Citation index built with %d provisions", len(_index))
+    return _index
+
+
+def resolve_citations(entities: list, index: CitationIndex = None) -> list:
+    """
+    Looks up the statute text for NER entities that carry a canonical citation.
+
+    Returns:
+        list[dict]: {"citation", "act", "section", "title", "text"} per resolved record.
+    """
+    index = index or get_citation_index()
+    resolved, seen = [], set()
+    for entity in entities or []:
+        key = normalize_citation(entity.get("canonical") or entity.get("reference", ""))
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        for record in index.lookup(key):
+            resolved.append({
+                "citation": format_citation(key),
+                "act": record.get("act", ""),
+                "section": record.get("article", record.get("section")),
+                "title": record.get("section_title", record.get("title", "")),
+                "text": record.get("section_desc", record.get("description", "")),
+            })
+    return resolved
+
+
+if __name__ == "__main__":
+    # Regression cases: (text, canonical citations found)
+    cases = [
+        ("The appellant's 2 brothers were present", []),
+        ("It's 5 pm", []),
+        ("The hearing was adjourned in order 2 days later", []),
+        ("Rule 5 of thumb", []),
+        ("Section 2 and 3 days", ["Section 2"]),
+        ("Sections 302 and 304 IPC", ["Section 302 IPC", "Section 304 IPC"]),
+        ("ss. 34, 120B and 302(1) I.P.C.", ["Section 34 IPC", "Section 120B IPC", "Section 302(1) IPC"]),
+        ("u/s 302 IPC", ["Section 302 IPC"]),
+        ("S.302 and S 304", ["Section 302", "Section 304"]),
+        ("Section 302 of the Indian Penal Code.", ["Section 302 IPC"]),
+        ("Order 7 Rule 11 CPC", ["Order 7 Rule 11 CPC"]),
+        ("Rule 3 of the IT Act", ["Rule 3 IT Act"]),
+        ("Arts. 14, 19 and 21", ["Article 14 Constitution", "Article 19 Constitution", "Article 21 Constitution"]),
+        ("Section 498-A IPC", ["Section 498A IPC"]),
+        ("Section 498A and Section 498 IPC", ["Section 498A", "Section 498 IPC"]),
+        ("Order XXXIX Rule 1 CPC", ["Order 39 Rule 1 CPC"]),
+        ("Section 420 r/w 120B IPC", ["Section 420 IPC", "Section 120B IPC"]),
+        ("Section 302 read with Section 34 of the Indian Penal Code", ["Section 302 IPC", "Section 34 IPC"]),
+        ("Section 5-year limitation", ["Section 5"]),
+    ]
+    failures = 0
+    for text, expected in cases:
+        found = [format_citation(key) for key, _, _ in find_citations(text)]
+        if found != expected:
+            failures += 1
+            print(f"❌ {text!r}: expected {expected}, got {found}")
+    print(f"✅ {len(cases) - failures}/{len(cases)} citation cases passed")
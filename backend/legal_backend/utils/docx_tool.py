@@ -26,18 +26,140 @@
 #         return extract_from_pdf(tmp_pdf)
 
 #     return "No text detected."
+import io
 import os
-from typing import List
-import docx
+import sys
+import time
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator, List
+from legal_backend.config import DOCX_ENGINE
 from legal_backend.utils.pdf_tools import extract_from_pdf
+from legal_backend.utils.office_pool import converted_pdf
+from legal_backend.utils.file_source import source_path, read_bytes, as_path
+from legal_backend.utils.tracing import traced
 
-def extract_from_docx(docx_path: str) -> dict:
+logger = logging.getLogger(__name__)
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P, W_T, W_TAB, W_BR, W_CR = W_NS + "p", W_NS + "t", W_NS + "tab", W_NS + "br", W_NS + "cr"
+W_TBL, W_TR, W_TC = W_NS + "tbl", W_NS + "tr", W_NS + "tc"
+# Elements whose direct children are finished blocks that can be dropped once read
+CONTAINERS = {W_NS + tag for tag in ("body", "hdr", "ftr", "footnotes", "endnotes")}
+
+
+def _iter_part_text(stream) -> Iterator[str]:
     """
-    Extract text from a Word document (.docx).
+    Incrementally parses one WordprocessingML part, yielding each paragraph's text
+    and each table row (cells joined with " | ") as soon as it closes. Finished
+    elements are detached from the tree, so memory stays flat on huge documents.
+    """
+    runs = []   # text of the paragraph being read
+    cells = []  # stack of open table cells -> their paragraph texts
+    rows = []   # stack of open table rows -> their cell texts
+    containers = []
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == W_TR:
+                rows.append([])
+            elif tag == W_TC:
+                cells.append([])
+            elif tag in CONTAINERS:
+                containers.append(elem)
+            continue
+
+        if tag == W_T:
+            runs.append(elem.text or "")
+        elif tag == W_TAB:
+            runs.append("\t")
+        elif tag in (W_BR, W_CR):
+            runs.append("\n")
+        elif tag == W_P:
+            text = "".join(runs).strip()
+            runs = []
+            if cells:
+                if text:
+                    cells[-1].append(text)
+            elif text:
+                yield text
+        elif tag == W_TC:
+            cell = "\n".join(cells.pop())
+            if rows:
+                rows[-1].append(cell)
+        elif tag == W_TR:
+            row = [cell for cell in rows.pop() if cell]
+            if row:
+                line = " | ".join(row)
+                if cells:  # nested table: the row belongs to the enclosing cell
+                    cells[-1].append(line)
+                else:
+                    yield line
+        elif tag in CONTAINERS:
+            containers.pop()
+
+        if containers and len(containers[-1]) and containers[-1][0] is elem:
+            containers[-1].remove(elem)
+        elif tag in (W_P, W_TBL):
+            elem.clear()
+
+
+def iter_docx_text(source) -> Iterator[str]:
+    """
+    Streams text out of a .docx (path or binary file object) without building the
+    document tree: the body first, then footnotes/endnotes, then headers/footers
+    (repeated header/footer lines are yielded once).
+    """
+    with zipfile.ZipFile(source) as archive:
+        names = set(archive.namelist())
+        yield from _iter_part_text(archive.open("word/document.xml"))
+
+        for note_part in ("word/footnotes.xml", "word/endnotes.xml"):
+            if note_part in names:
+                yield from _iter_part_text(archive.open(note_part))
+
+        seen = set()
+        for part in sorted(n for n in names if n.startswith(("word/header", "word/footer")) and n.endswith(".xml")):
+            for text in _iter_part_text(archive.open(part)):
+                if text not in seen:
+                    seen.add(text)
+                    yield text
+
+
+def _open(docx_source):
+    """Path as-is; in-memory bytes as a fresh BytesIO (shares the buffer, no copy)."""
+    return docx_source if isinstance(docx_source, str) else io.BytesIO(docx_source)
+
+
+def _python_docx_paragraphs(docx_source) -> List[str]:
+    import docx
+    doc = docx.Document(_open(docx_source))
+    return [p.text for p in doc.paragraphs if p.text.strip()]
+
+
+def _extract_paragraphs(docx_source, engine: str) -> List[str]:
+    if engine == "stream":
+        try:
+            return list(iter_docx_text(_open(docx_source)))
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            label = docx_source if isinstance(docx_source, str) else "in-memory document"
+            logger.warning("⚠️ Streaming DOCX parse failed for %s (%s); falling back to python-docx", label, e)
+    return _python_docx_paragraphs(docx_source)
+
+
+@traced("docx_extract")
+def extract_from_docx(docx_path, engine: str = DOCX_ENGINE) -> dict:
+    """
+    Extract text from a Word document (.docx): a path, bytes or binary file object.
+    engine="stream" (default) reads paragraphs, tables, headers, footers and
+    footnotes with an incremental XML parser; engine="python-docx" uses the
+    python-docx DOM (body paragraphs only).
     Falls back to PDF OCR if no text is found (e.g., scanned DOCX).
     Always returns JSON.
     """
-    if not os.path.exists(docx_path):
+    if isinstance(docx_path, str) and not os.path.exists(docx_path):
         return {
             "status": "error",
             "source": "docx",
@@ -45,8 +167,8 @@ def extract_from_docx(docx_path: str) -> dict:
         }
 
     try:
-        doc = docx.Document(docx_path)
-        paragraphs: List[str] = [p.text for p in doc.paragraphs if p.text.strip()]
+        docx_source = source_path(docx_path) or read_bytes(docx_path)
+        paragraphs = _extract_paragraphs(docx_source, engine)
 
         if paragraphs:
             return {
@@ -56,16 +178,16 @@ def extract_from_docx(docx_path: str) -> dict:
             }
 
         # If no text (e.g., scanned DOCX with embedded images) → convert to PDF
-        tmp_pdf = docx_path.replace(".docx", ".pdf")
-        os.system(f'libreoffice --headless --convert-to pdf "{docx_path}" --outdir "{os.path.dirname(docx_path)}"')
-
-        if os.path.exists(tmp_pdf):
-            pdf_result = extract_from_pdf(tmp_pdf)
-            return {
-                "status": pdf_result.get("status", "error"),
-                "source": "docx",
-                "text": pdf_result.get("text", "No text detected after PDF conversion.")
-            }
+        # via the LibreOffice worker pool; the PDF lives in a temp dir removed afterwards
+        with as_path(docx_source, ".docx") as path, converted_pdf(path) as tmp_pdf:
+            if tmp_pdf:
+                pdf_result = extract_from_pdf(tmp_pdf)
+                return {
+                    "status": pdf_result.get("status", "error"),
+                    "source": "docx",
+                    "text": pdf_result.get("text", "No text detected after PDF conversion."),
+                    "ocr_errors": pdf_result.get("ocr_errors", 0),
+                }
 
         return {
             "status": "error",
@@ -79,3 +201,52 @@ def extract_from_docx(docx_path: str) -> dict:
             "source": "docx",
             "text": f"Unexpected error: {str(e)}"
         }
+
+
+if __name__ == "__main__":
+    # Benchmark: streaming parser vs python-docx on a generated contract bundle.
+    # Each engine runs in its own process so peak RSS is measured separately.
+    #   python -m legal_backend.utils.docx_tool [pages]
+    import subprocess
+    import tempfile
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        engine, path = sys.argv[2], sys.argv[3]
+        def rss_mb(field):
+            with open("/proc/self/status") as status:
+                return next(int(line.split()[1]) for line in status if line.startswith(field)) / 1024
+
+        with open("/proc/self/clear_refs", "w") as refs:
+            refs.write("5")  # reset the peak-RSS counter so import-time memory is excluded
+        base_rss = rss_mb("VmRSS:")
+        start = time.perf_counter()
+        paragraphs = _extract_paragraphs(path, engine)
+        elapsed = time.perf_counter() - start
+        peak_rss = rss_mb("VmHWM:")
+        chars = sum(len(p) for p in paragraphs)
+        print(f"{engine:<12} {elapsed:8.2f}s  peak +{peak_rss - base_rss:7.1f} MB  "
+              f"blocks={len(paragraphs)} chars={chars}")
+        sys.exit(0)
+
+    import docx
+
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    clause = ("The Lessee shall indemnify the Lessor against all claims arising under "
+              "Section 73 of the Indian Contract Act, 1872, save as provided in Clause 14. ")
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "CONFIDENTIAL - Lease Agreement"
+    for page in range(pages):
+        for _ in range(8):
+            document.add_paragraph(clause * 2)
+        table = document.add_table(rows=3, cols=3)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = f"Schedule {page} item"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bundle.docx")
+        document.save(path)
+        del document
+        print(f"{pages} pages, {os.path.getsize(path) / 1e6:.1f} MB on disk")
+        for engine in ("python-docx", "stream"):
+            subprocess.run([sys.executable, "-m", "legal_backend.utils.docx_tool", "--run", engine, path], check=True)
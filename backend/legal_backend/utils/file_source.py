@@ -0,0 +1,142 @@
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from legal_backend.config import UPLOAD_IN_MEMORY_MAX_BYTES
+
+# Extractors accept a "source": a filesystem path, raw bytes, or a binary file object.
+# These helpers let them read it without writing it to disk again.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def source_path(source):
+    """Filesystem path behind a source (path string or file object backed by a real file), else None."""
+    if isinstance(source, str):
+        return source
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        if hasattr(source, "flush"):
+            source.flush()
+        return name
+    return None
+
+
+def read_bytes(source) -> bytes:
+    """Whole content of a source as bytes (file objects are rewound afterwards)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, io.BytesIO):
+        return source.getvalue()
+    position = source.tell()
+    source.seek(0)
+    try:
+        return source.read()
+    finally:
+        source.seek(position)
+
+
+def iter_chunks(source):
+    """Yields a source's bytes in CHUNK_SIZE pieces (for hashing large files without loading them)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+        return
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+        return
+    if isinstance(source, io.BytesIO):
+        with source.getbuffer() as view:  # slices of the buffer itself, no copies
+            for start in range(0, len(view), CHUNK_SIZE):
+                with view[start:start + CHUNK_SIZE] as chunk:
+                    yield chunk
+        return
+    position = source.tell()
+    source.seek(0)
+    try:
+        yield from iter(lambda: source.read(CHUNK_SIZE), b"")
+    finally:
+        source.seek(position)
+
+
+def open_binary(source):
+    """Something pdfplumber/zipfile/python-docx can open: the path if there is one, else a BytesIO."""
+    return source_path(source) or io.BytesIO(read_bytes(source))
+
+
+@contextmanager
+def as_path(source, suffix: str = ""):
+    """
+    Yields a filesystem path for a source. Only in-memory sources are written out
+    (for tools such as LibreOffice that need a real file), and removed afterwards.
+    """
+    path = source_path(source)
+    if path is not None:
+        yield path
+        return
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            tmp.write(source)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, tmp, CHUNK_SIZE)
+    try:
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+
+
+def make_upload_stream_factory(upload_dir: str):
+    """
+    Stream factory for multipart parsing (Werkzeug/Quart signature). Requests up to
+    UPLOAD_IN_MEMORY_MAX_BYTES are parsed into memory; larger ones are written once,
+    straight into upload_dir, as a named file the upload job later takes over.
+    """
+    def factory(total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_IN_MEMORY_MAX_BYTES:
+            return io.BytesIO()
+        suffix = os.path.splitext(filename or "")[1].lower()
+        return tempfile.NamedTemporaryFile("wb+", dir=upload_dir, suffix=suffix, delete=False)
+    return factory
+
+
+def take_upload(file_storage):
+    """
+    Detaches a parsed upload from the request: the BytesIO itself for in-memory
+    uploads (not copied; the request gets an empty stream in its place, so closing
+    the request leaves it open), or the path of the spooled file (closed, not
+    deleted). Either way the caller now owns it.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, io.BytesIO):
+        file_storage.stream = io.BytesIO()
+        stream.seek(0)
+        return stream
+    path = source_path(stream)
+    if path is None:
+        return read_bytes(stream)
+    stream.close()
+    return path
+
+
+def discard_uploads(files):
+    """Removes spooled files of uploads that were not handed to a job."""
+    for file_storage in files.values():
+        stream = file_storage.stream
+        path = None if getattr(stream, "closed", True) else source_path(stream)
+        if path is not None:
+            stream.close()
+            os.unlink(path)
+
+
+def release_upload(source):
+    """Frees what take_upload returned when it was not handed to a job after all."""
+    if isinstance(source, str):
+        os.unlink(source)
+    elif hasattr(source, "close"):
+        source.close()
@@ -46,69 +46,183 @@
 #     # 🚀 Send extracted text into NER
 #     return legal_ner(extracted_text)
 import os
+import json
+import hashlib
 from langchain.tools import tool
+
+from legal_backend.config import DOC_CACHE_ENABLED, DOC_CACHE_PATH, DOC_CACHE_MAX_MB, NER_SPACY_MODE, DOCX_ENGINE
 from legal_backend.utils.text_tools import extract_from_text
 from legal_backend.utils.pdf_tools import extract_from_pdf
-from legal_backend.utils.ocr_tools import extract_text_from_image
+from legal_backend.utils.ocr_tools import extract_image_text
 from legal_backend.utils.docx_tool import extract_from_docx
-from legal_backend.utils.ner_tools import legal_ner  
+from legal_backend.utils.ner_tools import run_legal_ner, patterns as ner_patterns
+from legal_backend.utils.citation_tools import CITATION_REGEX
+from legal_backend.utils.disk_cache import DiskLRUCache
+from legal_backend.utils.file_source import iter_chunks, read_bytes
+from legal_backend.utils.tracing import traced, register_stats
 
+# Bump when extraction output changes in a way the source fingerprint below cannot see
+EXTRACTOR_VERSION = "1"
 
-@tool("input_router", return_direct=True)
-def input_router(input_data: str):
+# Modules whose code determines the extracted text and entities
+_EXTRACTOR_MODULES = ["text_tools", "pdf_tools", "ocr_tools", "docx_tool", "ner_tools", "citation_tools",
+                      "file_source", "input_router"]
+
+
+def _extractor_fingerprint() -> str:
+    """
+    Version key for cached extractions: extractor version, NER patterns and mode, DOCX engine, and
+    the source of every extraction module. Any change invalidates old entries.
+    """
+    digest = hashlib.sha256(EXTRACTOR_VERSION.encode("utf-8"))
+    digest.update(json.dumps(ner_patterns, sort_keys=True).encode("utf-8"))
+    digest.update(CITATION_REGEX.pattern.encode("utf-8"))
+    digest.update(NER_SPACY_MODE.encode("utf-8"))
+    digest.update(DOCX_ENGINE.encode("utf-8"))
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in _EXTRACTOR_MODULES:
+        with open(os.path.join(utils_dir, f"{name}.py"), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+EXTRACTOR_FINGERPRINT = _extractor_fingerprint()
+
+document_cache = DiskLRUCache(DOC_CACHE_PATH, DOC_CACHE_MAX_MB * 1024 * 1024) if DOC_CACHE_ENABLED else None
+
+
+def _content_hash(input_data, is_file: bool) -> str:
+    digest = hashlib.sha256()
+    if is_file:
+        for chunk in iter_chunks(input_data):
+            digest.update(chunk)
+    else:
+        digest.update(input_data.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def document_cache_stats() -> dict:
+    """Hit/miss counters and size of the document cache ({} when disabled)."""
+    return document_cache.stats() if document_cache is not None else {}
+
+
+register_stats("document_cache", document_cache_stats)
+
+
+@traced("route_input")
+def route_input(input_data, progress=None, filename: str = None) -> dict:
     """
     Detects input type (text, PDF, DOCX, image) -> extracts text ->
     passes it into NER for legal entity extraction.
-    
+    Byte-identical inputs are answered from the document cache, keyed by content hash,
+    file type and EXTRACTOR_FINGERPRINT. Results with pages that failed OCR are not cached.
+
     Args:
-        input_data (str): User input (text, file path, or URL).
-    
+        input_data (str | bytes | file object): User input (text, file path, or URL),
+            or an uploaded file's bytes / binary stream (then `filename` gives its type).
+        progress (callable, optional): progress(pages_done, pages_total), called as
+            PDF pages finish (once, 1/1, for other inputs).
+        filename (str, optional): Original file name for bytes / stream input.
+
     Returns:
         dict: JSON with source, type, extracted_text, and structured legal entities.
     """
-    if not input_data:
+    if input_data is None or (isinstance(input_data, (str, bytes)) and not input_data):
         return {"error": "No input provided"}
 
+    if isinstance(input_data, str):
+        # Case 3: URLs (not implemented yet)
+        is_file = os.path.exists(input_data)
+        if not is_file and input_data.lower().startswith("http"):
+            return {"error": "URL input not yet supported", "source": input_data}
+        source = input_data
+    else:
+        # In-memory upload (bytes or stream): never written to disk here
+        is_file = True
+        source = filename or getattr(input_data, "name", None) or "upload"
+    ext = os.path.splitext(source)[-1].lower() if is_file else "text"
+
+    cache_key = None
+    if document_cache is not None:
+        cache_key = f"{_content_hash(input_data, is_file)}:{ext}:{EXTRACTOR_FINGERPRINT}"
+        cached = document_cache.get(cache_key)
+        if cached is not None:
+            cached["metadata"]["cached"] = True
+            return {"source": source, **cached}
+
+    result = _extract(input_data, is_file, progress, ext, source)
+
+    # Pages that failed OCR (e.g. a Vision outage) would be served from the cache forever
+    if cache_key is not None and "error" not in result and not result["metadata"].get("ocr_errors"):
+        document_cache.set(cache_key, {k: v for k, v in result.items() if k != "source"})
+    return result
+
+
+def _extract(input_data, is_file: bool, progress=None, ext: str = "text", source: str = None) -> dict:
+    source = source if source is not None else input_data
     extracted_text = None
     input_type = "text"
 
     # Case 1: Direct plain text
-    if not os.path.exists(input_data) and not input_data.lower().startswith("http"):
-        extracted_text = extract_from_text(input_data)
+    if not is_file:
+        extracted_text = extract_from_text.invoke(input_data)
         input_type = "text"
 
-    # Case 2: File input
-    elif os.path.exists(input_data):
-        ext = os.path.splitext(input_data)[-1].lower()
+    # Case 2: File input (path, bytes or stream)
+    else:
         if ext == ".pdf":
-            extracted_text = extract_from_pdf(input_data)
+            extracted_text = extract_from_pdf(input_data, progress=progress)
             input_type = "pdf"
         elif ext in [".jpg", ".jpeg", ".png"]:
-            extracted_text = extract_text_from_image(input_data)
+            extracted_text = extract_image_text(input_data)
             input_type = "image"
         elif ext == ".docx":
             extracted_text = extract_from_docx(input_data)
             input_type = "docx"
         elif ext == ".txt":
-            with open(input_data, "r") as f:
-                extracted_text = extract_from_text(f.read())
+            extracted_text = extract_from_text.invoke(read_bytes(input_data).decode("utf-8", errors="replace"))
             input_type = "txt"
 
-    # Case 3: URLs (not implemented yet)
-    elif input_data.lower().startswith("http"):
-        return {"error": "URL input not yet supported", "source": input_data}
-
     if not extracted_text:
-        return {"error": "Unsupported or empty input type", "source": input_data}
+        return {"error": "Unsupported or empty input type", "source": source}
+
+    # Extractors return {"status", "source", "text"}; NER needs the text itself
+    ocr_errors = 0
+    if isinstance(extracted_text, dict):
+        if extracted_text.get("status") != "success":
+            return {"error": extracted_text.get("text", "Extraction failed"), "source": source}
+        ocr_errors = extracted_text.get("ocr_errors", 0)
+        extracted_text = extracted_text.get("text", "")
+
+    if progress is not None and input_type != "pdf":
+        progress(1, 1)
 
     # 🚀 Run NER
-    ner_result = legal_ner(extracted_text)
+    ner_result = run_legal_ner(extracted_text)
+    metadata = dict(ner_result.get("metadata", {}))
+    if ocr_errors:
+        metadata["ocr_errors"] = ocr_errors
 
     # ✅ Flatten JSON so React/FastAPI doesn’t need to dig into nested dicts
     return {
-        "source": input_data,
+        "source": source,
         "type": input_type,
         "raw_text": ner_result.get("raw_text", ""),
         "legal_entities": ner_result.get("legal_entities", []),
-        "metadata": ner_result.get("metadata", {}),
+        "metadata": metadata,
     }
+
+
+@tool("input_router", return_direct=True)
+def input_router(input_data: str):
+    """
+    Detects input type (text, PDF, DOCX, image) -> extracts text ->
+    passes it into NER for legal entity extraction.
+    
+    Args:
+        input_data (str): User input (text, file path, or URL).
+    
+    Returns:
+        dict: JSON with source, type, extracted_text, and structured legal entities.
+    """
+    return route_input(input_data)
@@ -74,19 +74,23 @@
 #         "entities": structured_entities,
 #     }
 import re
+import time
+import bisect
+import threading
 import spacy
 from spacy.matcher import Matcher
 from langchain.tools import tool
 
-# Load spaCy model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    raise OSError(
-        "SpaCy model 'en_core_web_sm' is not installed. Run: python -m spacy download en_core_web_sm"
-    )
+from legal_backend.config import (
+    NER_SPACY_MODE, NER_SPACY_MODEL, NER_BATCH_SIZE,
+    NER_WINDOW_CHARS, NER_WINDOW_OVERLAP, NER_WORKERS,
+)
+from legal_backend.utils.citation_tools import find_citations, normalize_citation, format_citation
+from legal_backend.utils.tracing import traced
 
-matcher = Matcher(nlp.vocab)
+# The Matcher patterns only read TEXT, REGEX and IS_DIGIT, so no trained pipe is needed
+UNUSED_PIPES = ["tok2vec", "tagger", "morphologizer", "parser", "senter",
+                "attribute_ruler", "lemmatizer", "ner"]
 
 # Patterns for Indian legal references
 patterns = [
@@ -111,45 +115,239 @@ patterns = [
     ],
 ]
 
-matcher.add("LEGAL_REF", patterns)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Sentence punctuation after a mention ("Section 302 IPC."), but not an abbreviation's dot ("I.P.C.")
+TRAILING_PUNCTUATION = re.compile(r"(?<!\.[A-Za-z])[\s.,;:]+$")
 
+_nlp = None
+_matcher = None
+_load_lock = threading.Lock()
 
-@tool("legal_ner")
-def legal_ner(text: str):
+
+def load_nlp(mode: str = NER_SPACY_MODE):
     """
-    Extract legal references (Sections, Articles, Acts, Rules) from input text.
-    Returns structured JSON with raw text and extracted entities.
+    Builds the spaCy pipeline used for NER.
+    - "blank": tokenizer-only English pipeline (no model download needed).
+    - "model": NER_SPACY_MODEL with every unused trained pipe excluded.
     """
-    if not text or not isinstance(text, str):
-        return {"raw_text": "", "legal_entities": []}
+    if mode == "blank":
+        return spacy.blank("en")
+    try:
+        return spacy.load(NER_SPACY_MODEL, exclude=UNUSED_PIPES)
+    except OSError:
+        raise OSError(
+            f"SpaCy model '{NER_SPACY_MODEL}' is not installed. Run: python -m spacy download {NER_SPACY_MODEL}"
+        )
+
+
+def get_nlp():
+    """Returns the process-wide pipeline and matcher, loading them on first use."""
+    global _nlp, _matcher
+    if _nlp is None:
+        with _load_lock:
+            if _nlp is None:
+                nlp = load_nlp()
+                matcher = Matcher(nlp.vocab)
+                matcher.add("LEGAL_REF", patterns)
+                _matcher = matcher
+                _nlp = nlp
+    return _nlp, _matcher
+
+
+def split_windows(text: str, window_chars: int = NER_WINDOW_CHARS,
+                  overlap: int = NER_WINDOW_OVERLAP) -> list:
+    """
+    Splits text into overlapping windows that end on paragraph boundaries where possible.
+    Consecutive windows share at least `overlap` characters, so a citation that straddles
+    a seam is seen whole by one of them.
+
+    Returns:
+        list[tuple[int, str]]: (global start offset, window text) pairs.
+    """
+    if len(text) <= window_chars:
+        return [(0, text)]
+    overlap = min(overlap, window_chars // 2)
+
+    breaks = [m.end() for m in PARAGRAPH_BREAK.finditer(text)]
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window_chars, len(text))
+        if end < len(text):
+            # Prefer the last paragraph break past the overlap zone, then whitespace
+            i = bisect.bisect_right(breaks, end) - 1
+            if i >= 0 and breaks[i] > start + overlap:
+                end = breaks[i]
+            else:
+                space = text.rfind(" ", start + overlap, end)
+                end = space + 1 if space > 0 else end
+        windows.append((start, text[start:end]))
+        if end >= len(text):
+            return windows
 
-    doc = nlp(text)
-    matches = matcher(doc)
+        # Next window starts at the first paragraph break inside the overlap zone
+        i = bisect.bisect_left(breaks, end - overlap)
+        if i < len(breaks) and breaks[i] < end:
+            start = breaks[i]
+        else:
+            space = text.rfind(" ", start + 1, end - overlap)
+            start = space + 1 if space > 0 else end - overlap
 
-    results = []
-    for _, start, end in matches:
+
+def _window_mentions(doc, matcher, offset: int) -> list:
+    """Matcher + citation-regex hits in one window, as (global start, global end, text)."""
+    mentions = []
+    for _, start, end in matcher(doc):
         span = doc[start:end]
-        results.append(span.text)
+        mentions.append((offset + span.start_char, offset + span.end_char, span.text))
 
-    # Regex fallback for edge cases
-    regex_refs = re.findall(
-        r"(Sec\.?\s?\d+[A-Z]?|Section\s?\d+[A-Z]?|Art\.?\s?\d+|Article\s?\d+|Rule\s?\d+|Order\s?\d+)",
-        text,
-        re.IGNORECASE,
-    )
-    results.extend(regex_refs)
+    # Regex pass for forms the token patterns miss ("Sec. 302 I.P.C.", "Order 7 Rule 11 CPC");
+    # later items of a list ("Sections 302 and 304 IPC") are named by their canonical form
+    for key, start, end in find_citations(doc.text):
+        ref = doc.text[start:end]
+        mentions.append((offset + start, offset + end, ref if normalize_citation(ref) == key else format_citation(key)))
+    return mentions
 
-    # Deduplicate & clean
-    results = list(set([r.strip() for r in results if r.strip()]))
 
-    structured_entities = [{"reference": ref} for ref in results]
+def _build_result(text: str, mentions: list, windows: int = 1) -> dict:
+    """
+    Merges raw mentions into entities with global offsets.
+    Identical or nested mentions (window seams, matcher vs regex) keep only the longest;
+    mentions of the same canonical citation become one entity with every occurrence.
+    Offsets index into the returned raw_text (the text with outer whitespace stripped).
+    """
+    lead = len(text) - len(text.lstrip())
+    trimmed = set()
+    for start, end, ref in mentions:
+        source = text[start:end]
+        start += len(source) - len(source.lstrip())
+        end = start + len(TRAILING_PUNCTUATION.sub("", source.strip()))
+        ref = TRAILING_PUNCTUATION.sub("", ref.strip())
+        key = normalize_citation(ref) if ref else None
+        if key is not None:  # drops matcher hits such as "Rule 5 of thumb"
+            trimmed.add((start - lead, end - lead, ref, key))
+
+    # Longest first; for the same span, the mention that knows its act ("Section 420" r/w ... IPC)
+    kept = []
+    for start, end, ref, key in sorted(trimmed, key=lambda m: (m[0], -(m[1] - m[0]), not m[3].act, m[2])):
+        if kept and start >= kept[-1][0] and end <= kept[-1][1]:
+            continue  # contained in the previous (longer) mention
+        kept.append((start, end, ref, key))
+
+    entities = {}
+    for start, end, ref, key in kept:
+        entity = entities.get(key or ref)
+        if entity is None:
+            entities[key or ref] = entity = {
+                "reference": ref,
+                "canonical": format_citation(key) if key else ref,
+                "start": start,
+                "end": end,
+                "occurrences": [],
+                "_key": key,
+            }
+        entity["occurrences"].append([start, end])
+
+    # "Section 302" adds nothing once "Section 302 IPC" is present
+    with_act = {(k.kind, k.number, k.subclause) for k in (e["_key"] for e in entities.values()) if k and k.act}
+    structured_entities = []
+    for e in entities.values():
+        key = e.pop("_key")
+        if key and not key.act and (key.kind, key.number, key.subclause) in with_act:
+            continue
+        structured_entities.append(e)
 
     return {
         "raw_text": text.strip(),
         "legal_entities": structured_entities,
         "metadata": {
             "entity_count": len(structured_entities),
-            "extraction_method": "spaCy+regex"
+            "extraction_method": "spaCy+regex",
+            "windows": windows,
         }
     }
 
+
+def _ner_many(texts: list, batch_size: int = NER_BATCH_SIZE, n_process: int = NER_WORKERS) -> list:
+    """
+    Runs NER over many texts. Long texts are split into windows; every window of every
+    text streams through one nlp.pipe call (optionally across n_process processes), so
+    only one batch of Docs is alive at a time.
+    """
+    nlp, matcher = get_nlp()
+    jobs = []  # (text index, global offset, window)
+    for i, text in enumerate(texts):
+        if text and isinstance(text, str):
+            jobs.extend((i, offset, window) for offset, window in split_windows(text))
+
+    mentions = {i: [] for i, _, _ in jobs}
+    windows = {i: 0 for i, _, _ in jobs}
+    docs = nlp.pipe((window for _, _, window in jobs), batch_size=batch_size, n_process=n_process)
+    for (i, offset, _), doc in zip(jobs, docs):
+        mentions[i].extend(_window_mentions(doc, matcher, offset))
+        windows[i] += 1
+
+    return [
+        _build_result(text, mentions[i], windows[i]) if i in mentions
+        else {"raw_text": "", "legal_entities": []}
+        for i, text in enumerate(texts)
+    ]
+
+
+@traced("legal_ner")
+def run_legal_ner(text: str) -> dict:
+    """
+    Plain-function form of the legal_ner tool.
+    Texts longer than NER_WINDOW_CHARS are processed in overlapping windows, so huge
+    judgments never hit spaCy's max_length or hold one giant Doc in memory.
+    """
+    if not text or not isinstance(text, str):
+        return {"raw_text": "", "legal_entities": []}
+    return _ner_many([text])[0]
+
+
+def legal_ner_batch(texts: list, batch_size: int = NER_BATCH_SIZE) -> list:
+    """
+    Runs legal NER over many texts with nlp.pipe.
+
+    Returns:
+        list[dict]: one legal_ner result per input text, in order.
+    """
+    return _ner_many(texts, batch_size=batch_size)
+
+
+@tool("legal_ner")
+def legal_ner(text: str):
+    """
+    Extract legal references (Sections, Articles, Acts, Rules) from input text.
+    Returns structured JSON with raw text and extracted entities
+    (each with canonical form and start/end character offsets).
+    """
+    return run_legal_ner(text)
+
+
+if __name__ == "__main__":
+    # Benchmark: ~50-page judgment, full default pipeline vs the lean pipeline in use
+    paragraph = (
+        "The appellant was convicted under Section 302 IPC read with Sec. 34 IPC. "
+        "Learned counsel relied on Article 21 of the Constitution and Order 7 Rule 11 CPC, "
+        "and submitted that the trial court failed to appreciate the evidence on record. "
+    )
+    judgment = "\n\n".join([paragraph * 6] * 50 * 4)  # ~50 pages of text
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        out = fn()
+        print(f"{label:<32} {time.perf_counter() - start:8.3f}s  entities={len(out['legal_entities'])}")
+
+    try:
+        full = spacy.load(NER_SPACY_MODEL)
+        full.max_length = max(full.max_length, len(judgment) + 1)
+        full_matcher = Matcher(full.vocab)
+        full_matcher.add("LEGAL_REF", patterns)
+        timed(f"full {NER_SPACY_MODEL} pipeline",
+              lambda: _build_result(judgment, _window_mentions(full(judgment), full_matcher, 0)))
+    except OSError:
+        print(f"(skipping full pipeline: {NER_SPACY_MODEL} not installed)")
+
+    timed(f"lean pipeline ({NER_SPACY_MODE}, windowed)", lambda: run_legal_ner(judgment))
@@ -44,71 +44,211 @@
 
 #     return "No text detected."
 import os
+import hashlib
+import threading
 from google.cloud import vision
 from langchain.tools import tool
 
-# Initialize Vision API client
-client = vision.ImageAnnotatorClient()
+from legal_backend.config import (
+    VISION_BATCH_SIZE, VISION_BATCH_MAX_BYTES,
+    OCR_CACHE_ENABLED, OCR_CACHE_PATH, OCR_CACHE_MAX_MB,
+)
+from legal_backend.utils.disk_cache import DiskLRUCache
+from legal_backend.utils.file_source import read_bytes
+from legal_backend.utils.tracing import span, register_stats
 
-@tool("extract_text_from_image", return_direct=True)
-def extract_text_from_image(file_path: str) -> dict:
-    """
-    Extract text from an image (jpg, png).
-    Note: For PDFs, use pdf_tools.py instead.
-    Returns JSON object with status, source, and extracted text.
-    """
-    if not os.path.exists(file_path):
+# Vision API client, created lazily per process: gRPC channels must not cross a fork
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_vision_client() -> vision.ImageAnnotatorClient:
+    """Returns this process's Vision client, creating it on first use (and after a fork)."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = vision.ImageAnnotatorClient()
+                _client_pid = os.getpid()
+    return _client
+
+# OCR settings that change the output; part of every cache key
+OCR_SETTINGS = "TEXT_DETECTION:v1"
+
+ocr_cache = DiskLRUCache(OCR_CACHE_PATH, OCR_CACHE_MAX_MB * 1024 * 1024) if OCR_CACHE_ENABLED else None
+
+
+def ocr_cache_key(content: bytes) -> str:
+    """SHA-256 of the image bytes plus the OCR settings."""
+    digest = hashlib.sha256(content)
+    digest.update(OCR_SETTINGS.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def ocr_cache_stats() -> dict:
+    """Hit/miss counters and size of the OCR cache ({} when disabled)."""
+    return ocr_cache.stats() if ocr_cache is not None else {}
+
+
+register_stats("ocr_cache", ocr_cache_stats)
+
+
+def _parse_response(response) -> dict:
+    """Turns one Vision AnnotateImageResponse into the {status, source, text} shape."""
+    if response.error.message:
         return {
             "status": "error",
             "source": "ocr",
-            "text": f"File not found: {file_path}"
+            "text": f"Vision API Error: {response.error.message}"
         }
 
-    if file_path.lower().endswith(".pdf"):
+    if response.full_text_annotation and response.full_text_annotation.text:
         return {
-            "status": "error",
+            "status": "success",
             "source": "ocr",
-            "text": "Direct PDF input is not supported. Use pdf_tools.py instead."
+            "text": response.full_text_annotation.text.strip()
         }
 
-    try:
-        with open(file_path, "rb") as image_file:
-            content = image_file.read()
+    texts = response.text_annotations
+    if texts:
+        return {
+            "status": "success",
+            "source": "ocr",
+            "text": texts[0].description.strip()
+        }
+
+    return {
+        "status": "error",
+        "source": "ocr",
+        "text": "No text detected."
+    }
+
 
+def ocr_image_bytes(content: bytes) -> dict:
+    """
+    Extract text from in-memory image bytes (jpg, png) with one text_detection call.
+    Results are served from the OCR cache when the same image was seen before.
+    Returns JSON object with status, source, and extracted text.
+    """
+    key = ocr_cache_key(content) if ocr_cache is not None else None
+    if key is not None:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
         image = vision.Image(content=content)
-        response = client.text_detection(image=image)
+        with span("ocr") as ocr_span:
+            result = _parse_response(get_vision_client().text_detection(image=image))
+            if result["status"] == "error":
+                ocr_span.fail("vision_error")
+        if key is not None and result["status"] == "success":
+            ocr_cache.set(key, result)
+        return result
+    except Exception as e:
+        return {
+            "status": "error",
+            "source": "ocr",
+            "text": f"Unexpected error: {str(e)}"
+        }
+
+
+def _chunk_images(contents: list) -> list:
+    """Groups image indices into batches within the per-call image and payload limits."""
+    batches, current, current_bytes = [], [], 0
+    for i, content in enumerate(contents):
+        if current and (len(current) >= VISION_BATCH_SIZE or current_bytes + len(content) > VISION_BATCH_MAX_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += len(content)
+    if current:
+        batches.append(current)
+    return batches
 
-        if response.error.message:
-            return {
-                "status": "error",
-                "source": "ocr",
-                "text": f"Vision API Error: {response.error.message}"
-            }
 
-        if response.full_text_annotation and response.full_text_annotation.text:
+def ocr_images_batch(contents: list) -> list:
+    """
+    OCR many in-memory images with batch_annotate_images, up to VISION_BATCH_SIZE
+    images (and VISION_BATCH_MAX_BYTES) per RPC. Images already in the OCR cache
+    are not sent at all.
+
+    Returns:
+        list[dict]: one {status, source, text} result per image, in input order.
+    """
+    results = [None] * len(contents)
+    keys = [ocr_cache_key(c) for c in contents] if ocr_cache is not None else [None] * len(contents)
+    misses = []
+    for i, key in enumerate(keys):
+        cached = ocr_cache.get(key) if key is not None else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            misses.append(i)
+
+    feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+    for batch in _chunk_images([contents[i] for i in misses]):
+        batch = [misses[j] for j in batch]
+        try:
+            with span("ocr") as ocr_span:
+                response = get_vision_client().batch_annotate_images(requests=[
+                    vision.AnnotateImageRequest(image=vision.Image(content=contents[i]), features=[feature])
+                    for i in batch
+                ])
+                if any(r.error.message for r in response.responses):
+                    ocr_span.fail("vision_error")
+            for i, image_response in zip(batch, response.responses):
+                results[i] = _parse_response(image_response)
+                if keys[i] is not None and results[i]["status"] == "success":
+                    ocr_cache.set(keys[i], results[i])
+        except Exception as e:
+            for i in batch:
+                results[i] = {
+                    "status": "error",
+                    "source": "ocr",
+                    "text": f"Unexpected error: {str(e)}"
+                }
+    return results
+
+
+def extract_image_text(source) -> dict:
+    """
+    Extract text from an image (jpg, png) given as a path, bytes or binary file object.
+    Returns JSON object with status, source, and extracted text.
+    """
+    if isinstance(source, str):
+        if not os.path.exists(source):
             return {
-                "status": "success",
+                "status": "error",
                 "source": "ocr",
-                "text": response.full_text_annotation.text.strip()
+                "text": f"File not found: {source}"
             }
 
-        texts = response.text_annotations
-        if texts:
+        if source.lower().endswith(".pdf"):
             return {
-                "status": "success",
+                "status": "error",
                 "source": "ocr",
-                "text": texts[0].description.strip()
+                "text": "Direct PDF input is not supported. Use pdf_tools.py instead."
             }
 
-        return {
-            "status": "error",
-            "source": "ocr",
-            "text": "No text detected."
-        }
-
+    try:
+        content = read_bytes(source)
     except Exception as e:
         return {
             "status": "error",
             "source": "ocr",
             "text": f"Unexpected error: {str(e)}"
         }
+
+    return ocr_image_bytes(content)
+
+
+@tool("extract_text_from_image", return_direct=True)
+def extract_text_from_image(file_path: str) -> dict:
+    """
+    Extract text from an image (jpg, png).
+    Note: For PDFs, use pdf_tools.py instead.
+    Returns JSON object with status, source, and extracted text.
+    """
+    return extract_image_text(file_path)
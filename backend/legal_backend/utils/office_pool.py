@@ -0,0 +1,230 @@
+import os
+import time
+import queue
+import shutil
+import atexit
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from legal_backend.config import (
+    OFFICE_BINARY, OFFICE_POOL_SIZE, OFFICE_BASE_PORT, OFFICE_CONVERT_TIMEOUT, OFFICE_QUEUE_TIMEOUT,
+)
+
+try:
+    # LibreOffice's Python-UNO bridge: a system package (apt install python3-uno), not on PyPI
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+logger = logging.getLogger(__name__)
+
+if uno is None:
+    logger.warning("⚠️ python3-uno not importable; LibreOffice falls back to one soffice per conversion "
+                   "(install it with the system package manager to use the warm pool)")
+
+# Seconds to wait for a freshly started soffice to accept UNO connections
+STARTUP_TIMEOUT = 30
+# Seconds a timed-out conversion thread gets to fail once its soffice is killed
+ABANDON_TIMEOUT = 10
+
+
+def _prop(name, value):
+    p = PropertyValue()
+    p.Name = name
+    p.Value = value
+    return p
+
+
+class _OfficeProcess:
+    """One long-lived headless soffice listening on its own port with its own profile."""
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.port = OFFICE_BASE_PORT + slot
+        self.profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{slot}_")
+        self.process = None
+        self.desktop = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                OFFICE_BINARY, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+                f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+                f"-env:UserInstallation=file://{self.profile_dir}",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.desktop = None
+        logger.info("🖨️ Started soffice worker %d (pid=%d, port=%d)", self.slot, self.process.pid, self.port)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.desktop = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def _connect(self):
+        if self.process is None or self.process.poll() is not None:
+            self.restart()
+        if self.desktop is not None:
+            return self.desktop
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+                )
+                break
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.25)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        return self.desktop
+
+    def convert(self, src_path: str, out_dir: str) -> str:
+        """Renders src_path to PDF inside out_dir and returns the PDF path."""
+        out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(src_path))[0] + ".pdf")
+
+        if uno is None:
+            # No UNO bridge: one-shot conversion, still with a warm, isolated profile
+            subprocess.run(
+                [
+                    OFFICE_BINARY, "--headless", "--norestore",
+                    f"-env:UserInstallation=file://{self.profile_dir}",
+                    "--convert-to", "pdf", "--outdir", out_dir, src_path,
+                ],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=OFFICE_CONVERT_TIMEOUT, check=True,
+            )
+            return out_path
+
+        desktop = self._connect()
+        doc = desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(src_path)), "_blank", 0, (_prop("Hidden", True),)
+        )
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(out_path), (_prop("FilterName", "writer_pdf_Export"),))
+        finally:
+            doc.close(True)
+        return out_path
+
+
+class OfficeConverterPool:
+    """
+    Pool of long-lived headless LibreOffice processes for DOCX → PDF conversion.
+    At most `size` conversions run at once; further callers wait in a queue for a free
+    worker. A conversion that exceeds `timeout` gets its soffice killed; the worker only
+    rejoins the pool (restarted) once the conversion thread has finished, or is replaced
+    by a fresh worker if the thread is still stuck after ABANDON_TIMEOUT.
+    """
+
+    def __init__(self, size: int = OFFICE_POOL_SIZE, timeout: float = OFFICE_CONVERT_TIMEOUT):
+        self.timeout = timeout
+        self.workers = [_OfficeProcess(slot) for slot in range(size)]
+        self.available = queue.Queue()
+        for worker in self.workers:
+            if uno is not None:
+                worker.start()
+            self.available.put(worker)
+
+    def convert(self, src_path: str, out_dir: str, queue_timeout: float = OFFICE_QUEUE_TIMEOUT) -> str:
+        try:
+            worker = self.available.get(timeout=queue_timeout)
+        except queue.Empty:
+            raise TimeoutError("No LibreOffice worker became available in time.")
+
+        result = {}
+
+        def run():
+            try:
+                result["path"] = worker.convert(src_path, out_dir)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            logger.error("❌ LibreOffice conversion timed out after %ss; recycling worker %d",
+                         self.timeout, worker.slot)
+            worker.stop()  # makes the stuck UNO call fail; the worker stays out of the pool
+            threading.Thread(target=self._recycle, args=(worker, thread), daemon=True).start()
+            raise TimeoutError(f"Conversion timed out after {self.timeout}s")
+
+        try:
+            if "error" in result:
+                worker.desktop = None  # reconnect next time; _connect restarts a dead soffice
+                raise result["error"]
+            return result["path"]
+        finally:
+            self.available.put(worker)
+
+    def _recycle(self, worker: _OfficeProcess, thread: threading.Thread):
+        """Returns a timed-out worker to the pool once its conversion thread is done with it."""
+        thread.join(ABANDON_TIMEOUT)
+        if thread.is_alive():
+            logger.warning("⚠️ Conversion thread on worker %d is still stuck; replacing the worker", worker.slot)
+            stale, worker = worker, _OfficeProcess(worker.slot)
+            self.workers[self.workers.index(stale)] = worker
+            shutil.rmtree(stale.profile_dir, ignore_errors=True)
+        if uno is not None:
+            try:
+                worker.restart()
+            except Exception as e:  # _connect starts it on next use
+                logger.error("❌ Could not restart soffice worker %d: %s", worker.slot, e)
+        self.available.put(worker)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()
+            shutil.rmtree(worker.profile_dir, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_office_pool() -> OfficeConverterPool:
+    """Process-wide converter pool, started on first use (i.e. after any fork)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OfficeConverterPool()
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+@contextmanager
+def converted_pdf(src_path: str):
+    """
+    Converts a document to PDF in an isolated temp dir and yields the PDF path
+    (None if conversion failed). The temp dir is removed on exit.
+    """
+    out_dir = tempfile.mkdtemp(prefix="lo_out_")
+    try:
+        try:
+            pdf_path = get_office_pool().convert(src_path, out_dir)
+            if not os.path.exists(pdf_path):
+                pdf_path = None
+        except Exception as e:
+            logger.error("❌ LibreOffice conversion failed for %s: %s", src_path, e)
+            pdf_path = None
+        # Outside the except: an error raised in the caller's block propagates, not a second yield
+        yield pdf_path
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
@@ -44,53 +44,171 @@
 # if __name__ == "__main__":
 #     text = extract_from_pdf("samples/legal_notice.pdf")
 #     print(text[:500])
+import io
 import pdfplumber
-import tempfile
-import os
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import List
 
-from legal_backend.utils.ocr_tools import extract_text_from_image  # reuse OCR tool
+from legal_backend.config import PDF_WORKERS, PDF_OCR_WORKERS, PDF_PAGES_PER_TASK, VISION_BATCH_SIZE
+from legal_backend.utils.ocr_tools import ocr_images_batch  # reuse OCR tool
+from legal_backend.utils.file_source import source_path, read_bytes
+from legal_backend.utils.tracing import traced, bind
 
-def extract_from_pdf(pdf_path: str) -> dict:
+OCR_RESOLUTION = 300
+
+_process_pools = {}  # worker count -> ProcessPoolExecutor
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int = PDF_WORKERS) -> ProcessPoolExecutor:
+    """
+    Shared pool of `workers` processes for CPU-bound text-layer extraction, created
+    lazily. Children come from a forkserver (spawn where unavailable), never a fork
+    of this process, so they inherit no threads, locks or gRPC channels.
+    """
+    pool = _process_pools.get(workers)
+    if pool is None:
+        with _process_pool_lock:
+            pool = _process_pools.get(workers)
+            if pool is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload([__name__])  # imported once, not per child
+                else:
+                    context = multiprocessing.get_context("spawn")
+                pool = _process_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return pool
+
+
+def _extract_page_range(pdf_source, start: int, end: int) -> list:
+    """
+    Extracts the text layer of pages [start, end) of a PDF path or PDF bytes.
+    Pages without text are rendered in memory to PNG bytes for OCR (no temp files).
+
+    Returns:
+        list[tuple[int, str|None, bytes|None]]: (page index, text, PNG bytes) per page.
+    """
+    results = []
+    with pdfplumber.open(pdf_source if isinstance(pdf_source, str) else io.BytesIO(pdf_source)) as pdf:
+        for i in range(start, end):
+            page = pdf.pages[i]
+            text = page.extract_text()
+            if text:
+                results.append((i, text, None))
+            else:
+                # Page might be scanned → convert to image for OCR
+                image = page.to_image(resolution=OCR_RESOLUTION).original
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG")
+                results.append((i, None, buffer.getvalue()))
+    return results
+
+
+def _ocr_pages(pages: list) -> list:
     """
-    Extract text from a PDF file.
+    OCRs rendered pages with batched Vision calls.
+
+    Args:
+        pages (list[tuple[int, bytes]]): (page index, PNG bytes).
+    Returns:
+        list[tuple[int, str, bool]]: (page index, text or OCR error marker, whether OCR failed).
+    """
+    results = ocr_images_batch([content for _, content in pages])
+    texts = []
+    for (i, _), ocr_result in zip(pages, results):
+        # Append only the text from OCR result
+        if ocr_result["status"] == "success":
+            texts.append((i, ocr_result["text"], False))
+        else:
+            texts.append((i, f"[OCR Error on page {i}: {ocr_result['text']}]", True))
+    return texts
+
+
+@traced("pdf_extract")
+def extract_from_pdf(pdf_path, workers: int = PDF_WORKERS, progress=None) -> dict:
+    """
+    Extract text from a PDF (path, bytes or binary file object).
     - If text exists (selectable text), use pdfplumber.
     - If no text, fallback to OCR for those pages only.
-    Returns JSON object with status, source, and extracted text.
+    Text-layer extraction runs on a pool of `workers` processes in page ranges
+    (workers <= 1 extracts in this process). Scanned pages are
+    rendered in memory and sent to Vision in batch_annotate_images calls on a thread
+    pool, as soon as a batch fills up; pages are reassembled in order.
+    progress(pages_done, page_count), if given, is called as pages finish.
+    Returns JSON object with status, source, and extracted text; "ocr_errors" counts
+    pages whose OCR failed (their text is an error marker), and if no page yielded
+    text the status is "error".
     """
-    all_text: List[str] = []
-
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if text:
-                    all_text.append(text)
-                else:
-                    # Page might be scanned → convert to image and OCR
-                    image = page.to_image(resolution=300).original
-                    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                        image.save(tmp_img.name)
-                        ocr_result = extract_text_from_image(tmp_img.name)
-                    os.remove(tmp_img.name)
-
-                    # Append only the text from OCR result
-                    if ocr_result["status"] == "success":
-                        all_text.append(ocr_result["text"])
+        # Workers re-open a path themselves; in-memory PDFs are shipped to them as bytes
+        pdf_source = source_path(pdf_path) or read_bytes(pdf_path)
+        with pdfplumber.open(pdf_source if isinstance(pdf_source, str) else io.BytesIO(pdf_source)) as pdf:
+            page_count = len(pdf.pages)
+
+        pages_per_task = max(1, min(PDF_PAGES_PER_TASK, math.ceil(page_count / max(1, workers))))
+        if not isinstance(pdf_source, str):
+            pages_per_task = max(1, math.ceil(page_count / max(1, workers)))  # one copy of the bytes per worker
+        ranges = [(s, min(s + pages_per_task, page_count)) for s in range(0, page_count, pages_per_task)]
+
+        texts: List[str] = [None] * page_count
+        ocr_futures = []
+        pages_done = ocr_errors = 0
+        with ThreadPoolExecutor(max_workers=PDF_OCR_WORKERS) as ocr_pool:
+            if workers <= 1 or len(ranges) <= 1:
+                range_results = [_extract_page_range(pdf_source, 0, page_count)]
+            else:
+                pool = _get_process_pool(workers)
+                range_results = (f.result() for f in as_completed(
+                    [pool.submit(_extract_page_range, pdf_source, s, e) for s, e in ranges]
+                ))
+
+            scanned = []
+            for results in range_results:
+                for i, text, image in results:
+                    if image is not None:
+                        scanned.append((i, image))
+                        if len(scanned) >= VISION_BATCH_SIZE:
+                            ocr_futures.append(ocr_pool.submit(bind(_ocr_pages), scanned))
+                            scanned = []
                     else:
-                        all_text.append(f"[OCR Error on page {i}: {ocr_result['text']}]")
-
+                        texts[i] = text
+                        pages_done += 1
+                if progress is not None:
+                    progress(pages_done, page_count)
+            if scanned:
+                ocr_futures.append(ocr_pool.submit(bind(_ocr_pages), scanned))
+
+            for future in as_completed(ocr_futures):
+                for i, text, failed in future.result():
+                    texts[i] = text
+                    pages_done += 1
+                    ocr_errors += failed
+                if progress is not None:
+                    progress(pages_done, page_count)
+
+        all_text = [t for t in texts if t]
         if not all_text or not any(t.strip() for t in all_text):
             return {
                 "status": "error",
                 "source": "pdf",
                 "text": "No text could be extracted from the PDF."
             }
+        if ocr_errors == len(all_text):
+            return {
+                "status": "error",
+                "source": "pdf",
+                "text": f"OCR failed for every page: {next(t for t in texts if t)}",
+                "ocr_errors": ocr_errors,
+            }
 
         return {
             "status": "success",
             "source": "pdf",
-            "text": "\n".join(all_text).strip()
+            "text": "\n".join(all_text).strip(),
+            "ocr_errors": ocr_errors,
         }
 
     except Exception as e:
@@ -184,8 +184,32 @@
 #         return "An error occurred while generating the answer. The content may have been flagged by safety filters."
 
 # app/utils/response_tool.py
+import re
+import json
 
-def format_response(query: str, entities: list, context: str, llm_answer, citations: list) -> dict:
+
+def parse_llm_json(content: str) -> dict:
+    """
+    Parses a model's JSON answer (optionally wrapped in ```json fences).
+    Output that is not valid JSON becomes {"summary": <text>, "explanation": "", "citations": []}.
+    """
+    content = (content or "").strip()
+    cleaned = re.sub(r"^```json|```$", "", content, flags=re.MULTILINE).strip()
+    try:
+        parsed = json.loads(cleaned)
+        if isinstance(parsed, dict):
+            return parsed
+    except Exception:
+        pass
+    return {
+        "summary": content,
+        "explanation": "",
+        "citations": []
+    }
+
+
+def format_response(query: str, entities: list, context: str, llm_answer, citations: list,
+                    metadata: dict = None) -> dict:
     """
     Formats the final response into a consistent JSON structure.
 
@@ -195,6 +219,7 @@ def format_response(query: str, entities: list, context: str, llm_answer, citati
         context (str): Retrieved context (empty for now, kept for extensibility).
         llm_answer (str|dict): The final answer generated by the LLM.
         citations (list): Extracted legal citations (empty for now).
+        metadata (dict, optional): Request details such as prompt token usage.
 
     Returns:
         dict: JSON-serializable response object.
@@ -215,5 +240,11 @@ def format_response(query: str, entities: list, context: str, llm_answer, citati
             "summary": llm_answer.get("summary", ""),
             "explanation": llm_answer.get("explanation", "")
         },
-        "citations": citations if citations else []
+        "citations": citations if citations else [],
+        "metadata": metadata if metadata else {}
     }
+
+
+def format_sse(event: str, data) -> str:
+    """Encodes one server-sent event: "event: <name>\ndata: <json>\n\n"."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
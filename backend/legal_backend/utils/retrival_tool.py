@@ -267,6 +267,7 @@
 #             print(doc.page_content, "| Metadata:", doc.metadata)
 #     else:
 #         print("⚠️ No documents retrieved")
+import asyncio
 import logging
 import os
 from typing import List
@@ -275,12 +276,16 @@ from langchain.schema import Document
 from google.cloud.aiplatform_v1.types import FindNeighborsRequest, IndexDatapoint
 from vertexai.language_models import TextEmbeddingModel
 
-import app.config as config
+import legal_backend.config as config
+from legal_backend.utils.tracing import span
 
 # --- Logging setup ---
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
+# Per-request input limit of the Vertex AI text embedding API
+MAX_EMBEDDING_INPUTS = 250
+
 
 class VertexAIRetriever:
     def __init__(self, k: int = 3):
@@ -306,6 +311,8 @@ class VertexAIRetriever:
             self.match_client = MatchServiceClient(
                 client_options={"api_endpoint": api_endpoint}
             )
+            self.api_endpoint = api_endpoint
+            self.async_match_client = None
 
             self.index_endpoint = (
                 f"projects/{config.PROJECT_ID}/locations/{config.LOCATION}/indexEndpoints/{config.INDEX_ENDPOINT_ID}"
@@ -320,64 +327,200 @@ class VertexAIRetriever:
             logger.error(f"❌ Error initializing VertexAIRetriever: {e}", exc_info=True)
             raise
 
+    def _to_documents(self, neighbors) -> List[Document]:
+        docs = []
+        for neighbor in neighbors:
+            metadata = {}
+            if neighbor.datapoint.restricts:
+                metadata = {r.namespace: r.allow for r in neighbor.datapoint.restricts}
+
+            docs.append(
+                Document(
+                    page_content=metadata.get("section_desc", neighbor.datapoint.datapoint_id),
+                    metadata={
+                        "id": neighbor.datapoint.datapoint_id,
+                        "score": neighbor.distance,
+                        "section": metadata.get("Section"),
+                        "chapter": metadata.get("chapter"),
+                        "act": metadata.get("act"),
+                        "source": metadata.get("source", "Vector DB"),
+                    },
+                )
+            )
+        return docs
+
     def get_relevant_documents(self, query: str) -> List[Document]:
+        docs = self.get_relevant_documents_batch([query])[0]
+        if not docs:
+            logger.warning("⚠️ No neighbors found for query.")
+        return docs
+
+    def _find_neighbors_request(self, query_embeddings, k: int) -> FindNeighborsRequest:
+        return FindNeighborsRequest(
+            index_endpoint=self.index_endpoint,
+            deployed_index_id=self.deployed_index_id,
+            queries=[
+                FindNeighborsRequest.Query(
+                    datapoint=IndexDatapoint(feature_vector=embedding),
+                    neighbor_count=k,
+                )
+                for embedding in query_embeddings
+            ],
+            return_full_datapoint=True,
+        )
+
+    def _split_response(self, response, n_queries: int) -> List[List[Document]]:
+        # nearest_neighbors comes back in the same order as request.queries
+        results = [[] for _ in range(n_queries)]
+        if response and response.nearest_neighbors:
+            for i, nearest in enumerate(response.nearest_neighbors[:n_queries]):
+                results[i] = self._to_documents(nearest.neighbors)
+            logger.info(f"📄 Found {sum(len(r) for r in results)} neighbors")
+        return results
+
+    def get_relevant_documents_batch(self, queries: List[str], k: int = None) -> List[List[Document]]:
+        """
+        Retrieve top-k documents for many queries in two round trips:
+        one get_embeddings call and one FindNeighborsRequest carrying every query.
+
+        Returns:
+            List[List[Document]]: one document list per query, in input order
+            (empty lists if retrieval fails).
+        """
+        if not queries:
+            return []
+        k = k or self.k
+
         try:
-            logger.info(f"🔎 Creating embedding for query: '{query}'")
-            query_embedding = self.embedding_model.get_embeddings([query])[0].values
-            logger.info(f"✅ Embedding generated (len={len(query_embedding)})")
-
-            request = FindNeighborsRequest(
-                index_endpoint=self.index_endpoint,
-                deployed_index_id=self.deployed_index_id,
-                queries=[
-                    FindNeighborsRequest.Query(
-                        datapoint=IndexDatapoint(feature_vector=query_embedding),
-                        neighbor_count=self.k,
-                    )
-                ],
-                return_full_datapoint=True,
-            )
+            logger.info(f"🔎 Creating embeddings for {len(queries)} queries")
+            query_embeddings = []
+            with span("embedding"):
+                for start in range(0, len(queries), MAX_EMBEDDING_INPUTS):
+                    emb_objs = self.embedding_model.get_embeddings(queries[start:start + MAX_EMBEDDING_INPUTS])
+                    query_embeddings.extend(e.values for e in emb_objs)
 
             # --- Use MatchServiceClient only (correct one) ---
-            logger.info("📡 Calling MatchServiceClient.find_neighbors...")
-            response = self.match_client.find_neighbors(request=request)
-
-            # --- Raw dump ---
-            logger.info(f"📝 RAW RESPONSE: {response}")
-
-            docs = []
-            if response and response.nearest_neighbors:
-                logger.info(f"📄 Found {len(response.nearest_neighbors[0].neighbors)} neighbors")
-                for neighbor in response.nearest_neighbors[0].neighbors:
-                    metadata = {}
-                    if neighbor.datapoint.restricts:
-                        metadata = {r.namespace: r.allow for r in neighbor.datapoint.restricts}
-
-                    docs.append(
-                        Document(
-                            page_content=metadata.get("section_desc", neighbor.datapoint.datapoint_id),
-                            metadata={
-                                "id": neighbor.datapoint.datapoint_id,
-                                "score": neighbor.distance,
-                                "section": metadata.get("Section"),
-                                "chapter": metadata.get("chapter"),
-                                "act": metadata.get("act"),
-                                "source": metadata.get("source", "Vector DB"),
-                            },
-                        )
+            logger.info(f"📡 Calling MatchServiceClient.find_neighbors ({len(queries)} queries)...")
+            with span("find_neighbors"):
+                response = self.match_client.find_neighbors(request=self._find_neighbors_request(query_embeddings, k))
+            logger.debug(f"📝 RAW RESPONSE: {response}")
+            return self._split_response(response, len(queries))
+
+        except Exception as e:
+            logger.error(f"❌ Error during document retrieval: {e}", exc_info=True)
+            return [[] for _ in queries]
+
+    async def aget_relevant_documents(self, query: str) -> List[Document]:
+        return (await self.aget_relevant_documents_batch([query]))[0]
+
+    async def aget_relevant_documents_batch(self, queries: List[str], k: int = None) -> List[List[Document]]:
+        """Async get_relevant_documents_batch: awaits the embedding and Matching Engine calls."""
+        if not queries:
+            return []
+        k = k or self.k
+
+        try:
+            if self.async_match_client is None:
+                # gRPC aio clients bind to the running event loop, so build on first await
+                from google.cloud.aiplatform_v1.services.match_service import MatchServiceAsyncClient
+                self.async_match_client = MatchServiceAsyncClient(client_options={"api_endpoint": self.api_endpoint})
+
+            query_embeddings = []
+            with span("embedding"):
+                for start in range(0, len(queries), MAX_EMBEDDING_INPUTS):
+                    emb_objs = await self.embedding_model.get_embeddings_async(
+                        queries[start:start + MAX_EMBEDDING_INPUTS]
                     )
-            else:
-                logger.warning("⚠️ No neighbors found for query.")
+                    query_embeddings.extend(e.values for e in emb_objs)
 
-            return docs
+            with span("find_neighbors"):
+                response = await self.async_match_client.find_neighbors(
+                    request=self._find_neighbors_request(query_embeddings, k)
+                )
+            return self._split_response(response, len(queries))
 
         except Exception as e:
-            logger.error(f"❌ Error during document retrieval: {e}", exc_info=True)
+            logger.error(f"❌ Error during async document retrieval: {e}", exc_info=True)
+            return [[] for _ in queries]
+
+
+class LocalRetriever:
+    def __init__(self, k: int = 3, embeddings_path: str = None, index=None, embedding_model=None):
+        """
+        In-process retriever over the local embeddings.
+        Same interface as VertexAIRetriever, but neighbours come from a NumPy index
+        instead of a Matching Engine round trip. Prefers the compiled memory-mapped
+        store and falls back to parsing embeddings.jsonl.
+        """
+        from legal_backend.services.local_index import LocalVectorIndex
+
+        if embeddings_path is None:
+            embeddings_path = (config.EMBEDDINGS_STORE_DIR if os.path.isdir(config.EMBEDDINGS_STORE_DIR)
+                               else config.EMBEDDINGS_LOCAL_FILE)
+
+        try:
+            self.index = index if index is not None else LocalVectorIndex.load(embeddings_path)
+            self.embedding_model = embedding_model or TextEmbeddingModel.from_pretrained(config.EMBEDDING_MODEL)
+            self.k = k
+
+            logger.info(f"✅ LocalRetriever initialized with {len(self.index)} vectors.")
+        except Exception as e:
+            logger.error(f"❌ Error initializing LocalRetriever: {e}", exc_info=True)
+            raise
+
+    def _to_document(self, row: int, score: float) -> Document:
+        meta = self.index.metadata[row]
+        return Document(
+            page_content=meta.get("section_desc", meta.get("description", str(self.index.ids[row]))),
+            metadata={
+                "id": str(self.index.ids[row]),
+                "score": score,
+                "section": meta.get("section"),
+                "chapter": meta.get("chapter"),
+                "act": meta.get("act"),
+                "source": meta.get("source", "Local Index"),
+            },
+        )
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        return self.get_relevant_documents_batch([query])[0]
+
+    def get_relevant_documents_batch(self, queries: List[str], k: int = None) -> List[List[Document]]:
+        """Retrieve top-k documents for many queries with one embedding call and one matrix product."""
+        if not queries:
             return []
+        try:
+            query_embeddings = []
+            with span("embedding"):
+                for start in range(0, len(queries), MAX_EMBEDDING_INPUTS):
+                    emb_objs = self.embedding_model.get_embeddings(queries[start:start + MAX_EMBEDDING_INPUTS])
+                    query_embeddings.extend(e.values for e in emb_objs)
+
+            with span("find_neighbors"):
+                hits = self.index.search_batch(query_embeddings, k=k or self.k)
+            return [[self._to_document(row, score) for row, score in query_hits] for query_hits in hits]
+
+        except Exception as e:
+            logger.error(f"❌ Error during local document retrieval: {e}", exc_info=True)
+            return [[] for _ in queries]
+
+    async def aget_relevant_documents(self, query: str) -> List[Document]:
+        return (await self.aget_relevant_documents_batch([query]))[0]
+
+    async def aget_relevant_documents_batch(self, queries: List[str], k: int = None) -> List[List[Document]]:
+        """Async variant: the search is in-process NumPy, so it runs in a worker thread."""
+        return await asyncio.to_thread(self.get_relevant_documents_batch, queries, k)  # to_thread keeps the trace context
+
+
+def get_retriever(k: int = 3):
+    """Returns the retriever selected by config.RETRIEVER_BACKEND ("vertex" or "local")."""
+    if config.RETRIEVER_BACKEND == "local":
+        return LocalRetriever(k=k)
+    return VertexAIRetriever(k=k)
 
 
 if __name__ == "__main__":
-    retriever = VertexAIRetriever(k=3)
+    retriever = get_retriever(k=3)
     query = "Indian Penal Code Chapter 1 section 2 definition of crime"
     results = retriever.get_relevant_documents(query)
 
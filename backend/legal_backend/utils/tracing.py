@@ -0,0 +1,276 @@
+import os
+import time
+import logging
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from legal_backend.config import (
+    METRICS_ENABLED, TIMINGS_IN_RESPONSE, OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME,
+)
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest,
+    )
+    from prometheus_client.core import GaugeMetricFamily
+    from prometheus_client import multiprocess
+except ImportError:  # optional: /metrics then reports that it is unavailable
+    Histogram = None
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages run from a few ms (cache hits) to minutes (OCR of long scans, map-reduce)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+if Histogram is not None and METRICS_ENABLED:
+    STAGE_SECONDS = Histogram(
+        "legal_lens_stage_seconds", "Latency of each pipeline stage", ["stage"], buckets=LATENCY_BUCKETS,
+    )
+    STAGE_IN_FLIGHT = Gauge(
+        "legal_lens_stage_in_flight", "Calls currently inside each stage", ["stage"], multiprocess_mode="livesum",
+    )
+    STAGE_ERRORS = Counter(
+        "legal_lens_stage_errors_total", "Failed calls per stage (exception class or error result)",
+        ["stage", "error"],
+    )
+else:
+    STAGE_SECONDS = STAGE_IN_FLIGHT = STAGE_ERRORS = None
+
+_current = contextvars.ContextVar("legal_lens_trace", default=None)
+_stats_sources = {}
+
+
+class Trace:
+    """Spans recorded for one request; spans from any thread/task sharing its context land here."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, started: float, seconds: float, error: str = None):
+        with self._lock:
+            self.spans.append((stage, started - self.start, seconds, error))
+
+    def timings(self) -> dict:
+        """
+        Per-stage totals in ms. Stages nest (route_input includes pdf_extract, ocr and
+        legal_ner), so they do not add up to total_ms.
+        """
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for stage, _, seconds, error in spans:
+            entry = stages.setdefault(stage, {"ms": 0.0, "count": 0})
+            entry["ms"] += seconds * 1000
+            entry["count"] += 1
+            if error:
+                entry["errors"] = entry.get("errors", 0) + 1
+        for entry in stages.values():
+            entry["ms"] = round(entry["ms"], 2)
+        return {"total_ms": round((time.perf_counter() - self.start) * 1000, 2), "stages": stages}
+
+
+@contextmanager
+def trace(name: str):
+    """Starts a request trace (root span `name`); spans opened inside it are collected on it."""
+    current = Trace(name)
+    token = _current.set(current)
+    try:
+        with span(name):
+            yield current
+    finally:
+        _current.reset(token)
+
+
+class _Span:
+    def __init__(self):
+        self.error = None
+
+    def fail(self, error: str):
+        """Marks the span failed without raising (e.g. an extractor's {"status": "error"} result)."""
+        self.error = error
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times one pipeline stage: latency histogram, in-flight gauge and error counter in
+    /metrics, an entry in the current request's timings, and an OpenTelemetry span
+    when OTLP export is configured.
+    """
+    state = _Span()
+    otel = _get_tracer()
+    otel_cm = otel.start_as_current_span(stage) if otel is not None else None
+    otel_span = otel_cm.__enter__() if otel_cm is not None else None
+    if STAGE_IN_FLIGHT is not None:
+        STAGE_IN_FLIGHT.labels(stage).inc()
+    started = time.perf_counter()
+    exc_info = (None, None, None)
+    try:
+        yield state
+    except Exception as e:
+        state.error = type(e).__name__
+        exc_info = (type(e), e, e.__traceback__)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        if STAGE_IN_FLIGHT is not None:
+            STAGE_IN_FLIGHT.labels(stage).dec()
+            STAGE_SECONDS.labels(stage).observe(seconds)
+            if state.error:
+                STAGE_ERRORS.labels(stage, state.error).inc()
+        current = _current.get()
+        if current is not None:
+            current.add(stage, started, seconds, state.error)
+        if otel_cm is not None:
+            if state.error and exc_info[0] is None:
+                from opentelemetry.trace import Status, StatusCode
+                otel_span.set_attribute("error.type", state.error)
+                otel_span.set_status(Status(StatusCode.ERROR, state.error))
+            otel_cm.__exit__(*exc_info)
+
+
+def traced(stage: str):
+    """
+    Decorator form of span() for sync and async functions. A returned
+    {"status": "error", ...} dict (the extractors' convention) counts as a failure.
+    """
+    def decorator(fn):
+        def check(result, state):
+            if isinstance(result, dict) and result.get("status") == "error":
+                state.fail("error_result")
+            return result
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage) as state:
+                    return check(await fn(*args, **kwargs), state)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage) as state:
+                return check(fn(*args, **kwargs), state)
+        return wrapper
+    return decorator
+
+
+def timings_requested(data) -> bool:
+    """Whether a response gets a "timings" block: TIMINGS_IN_RESPONSE, or "timings": true in the request."""
+    return TIMINGS_IN_RESPONSE or bool(isinstance(data, dict) and data.get("timings"))
+
+
+def bind(fn):
+    """
+    fn bound to the caller's context, for run_in_executor / thread pools (which do not
+    carry contextvars over), so spans inside still reach the request's trace.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+# --- OpenTelemetry (optional) ---
+
+_tracer = None
+_tracer_pid = None
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """This process's OTLP tracer when OTEL_EXPORTER_OTLP_ENDPOINT is set (created after any fork)."""
+    global _tracer, _tracer_pid
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    if _tracer_pid != os.getpid():
+        with _tracer_lock:
+            if _tracer_pid != os.getpid():
+                _tracer = None
+                try:
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                    try:
+                        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+                    except ImportError:
+                        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+                    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+                    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                    _tracer = provider.get_tracer("legal_backend")
+                    logger.info("📡 Exporting traces to %s", OTEL_EXPORTER_OTLP_ENDPOINT)
+                except ImportError as e:
+                    logger.warning("⚠️ OTEL_EXPORTER_OTLP_ENDPOINT is set but OpenTelemetry is not installed: %s", e)
+                _tracer_pid = os.getpid()
+    return _tracer
+
+
+# --- /metrics ---
+
+def register_stats(name: str, fn):
+    """
+    Exposes a module's stats() dict (cache hit rates etc.) as gauges named
+    legal_lens_<name>_<key>; nested dicts extend the name. Read at scrape time.
+    """
+    _stats_sources[name] = fn
+
+
+def _stats_gauges():
+    for name, fn in _stats_sources.items():
+        try:
+            stats = fn() or {}
+        except Exception as e:
+            logger.warning("⚠️ Stats for %s unavailable: %s", name, e)
+            continue
+        pending = [(f"legal_lens_{name}", stats)]
+        while pending:
+            prefix, values = pending.pop()
+            for key, value in values.items():
+                if isinstance(value, dict):
+                    pending.append((f"{prefix}_{key}", value))
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge = GaugeMetricFamily(f"{prefix}_{key}", f"{name} stats: {key}")
+                    gauge.add_metric([], value)
+                    yield gauge
+
+
+class _StatsCollector:
+    def collect(self):
+        yield from _stats_gauges()
+
+
+class _DefaultCollector:
+    """The process-wide default registry (stage metrics, process/GC metrics) as one collector."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def metrics_available() -> bool:
+    return STAGE_SECONDS is not None
+
+
+def metrics_response():
+    """
+    (body, content type) for GET /metrics. Under gunicorn with PROMETHEUS_MULTIPROC_DIR
+    set, stage metrics are aggregated over all workers; cache stats are read from the
+    shared SQLite stores, coalescing stats are the answering worker's.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_DefaultCollector())
+    registry.register(_StatsCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Drops a dead worker's live gauges (gunicorn child_exit hook)."""
+    if Histogram is not None and "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
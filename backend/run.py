@@ -6,6 +6,10 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 from legal_backend.main import app
+from legal_backend.bootstrap import start_bootstrap
 
 if __name__ == "__main__":
+    # Warm up in the background; under the debug reloader, only in the serving child
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_bootstrap()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -65,8 +65,22 @@ export function DynamicQueryInterface() {
         throw new Error(`Upload failed: ${response.statusText}`)
       }
 
-      const result = await response.json()
-      setAnalysisResult(result)
+      // Extraction runs as a background job; poll until it finishes
+      const { job_id } = await response.json()
+      let job: any = null
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        const jobResponse = await fetch(`${apiUrl}/api/jobs/${job_id}`)
+        if (!jobResponse.ok) {
+          throw new Error(`Job status failed: ${jobResponse.statusText}`)
+        }
+        job = await jobResponse.json()
+      } while (job.status === 'queued' || job.status === 'running')
+
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'File processing failed')
+      }
+      setAnalysisResult(job.result)
     } catch (error) {
       console.error('Upload error:', error)
       setError(error instanceof Error ? error.message : 'File upload failed')